@@ -30,21 +30,17 @@
 #       ./execute_dlpx -dh <<delphix host>> -du <<delphix user>> -dp <<delphix password>> -job
 #                                   <<job id>> -jt <<job type - profile or mask>>
 
-import argparse
-import inspect
+import csv
 import json
-import socket
 import os
 import os.path
 import datetime
 from datetime import datetime
 import sys
 from sys import exit
-import subprocess
-from subprocess import Popen, PIPE
 import time
-import requests
-from requests.exceptions import RequestException
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dlpx_client import EngineClient, EngineApiError, api_call_status, iter_pages
 # from functools import cached_property
 
 from typing import List, Optional, Tuple, Any
@@ -52,196 +48,347 @@ from typing import List, Optional, Tuple, Any
 import logging
 
 
-def api_call_status(func_name, request):
-    status_code = request.status_code
-    status_msg = request.text
-    if status_code != 200:
-        logging.info(f"Request in operation {func_name} failed with status code {status_code}")
-        logging.info(f"Message: {status_msg}")
-        print(f"Request in operation {func_name} failed with status code {status_code}")
-        print(f"Message: {status_msg}")
-        os._exit(1)
-    else:
-        logging.info(f"Request in Function {func_name} succeeds with status code {status_code}")
-
-
 def authenticate_api() -> Any:
-    """Trigger profiling or masking """
-    global dlpx_host, dlpx_user, dlpx_pass, baseurl, job_id
+    """Login to the engine and return a pooled client shared by the crawl workers"""
+    global dlpx_host, dlpx_user, dlpx_pass, baseurl
 
-    baseurl_80 = 'http://' + dlpx_host + '/masking/api'
-    baseurl_443 = 'https://' + dlpx_host + '/masking/api'
+    client = EngineClient(dlpx_host, dlpx_user, dlpx_pass, pool_size=crawl_workers)
+    client.ensure_login()
+    baseurl = client.baseurl
+    return client
+
+
+METADATA_FIELDS = ['applicationName', 'environmentName', 'connectorName', 'rulesetName', 'databaseName',
+                   'schemaName', 'databaseType', 'rulesetId', 'profileJobId', 'maskingJobId']
+
+
+def get_environments(client, app) -> Any:
+    global verifyCert
+
+    params_post = {'page_size': 5000, 'application_id': app['applicationId']}
+    env_extract = client.get('/environments', params=params_post, verify=verifyCert)
+    if env_extract.status_code == 404:
+        return []
+    api_call_status('Extract environments', env_extract)
+    return json.loads(env_extract.text)['responseList']
+
+
+def index_by(items, key) -> Any:
+    index = {}
+    for item in items:
+        index.setdefault(item[key], []).append(item)
+    return index
+
+
+def join_rows(app, env, conn_lst, rules_by_conn, jobs_by_rule) -> Any:
+    """Yield one metadata row per connector / ruleset / job combination of an environment"""
+    for conn in conn_lst:
+        conn_row = {'applicationName': app['applicationName'], 'environmentName': env['environmentName'],
+                    'connectorName': conn['connectorName'], 'rulesetName': '',
+                    'databaseName': conn['databaseName'], 'schemaName': conn['schemaName'],
+                    'databaseType': conn['databaseType'], 'rulesetId': '', 'profileJobId': '', 'maskingJobId': ''}
+
+        for rule in rules_by_conn.get(conn['databaseConnectorId'], [None]):
+            rule_row = dict(conn_row)
+            if rule is not None:
+                rule_row['rulesetName'] = rule['rulesetName']
+                rule_row['rulesetId'] = rule['rulesetId']
+
+            for job in jobs_by_rule.get(rule_row['rulesetId'], [None]):
+                row = dict(rule_row)
+                if job is not None:
+                    row['profileJobId'] = job['profileJobId']
+                    row['maskingJobId'] = job['maskingJobId']
+                yield row
+
+
+def empty_row(app) -> Any:
+    row = dict.fromkeys(METADATA_FIELDS, '')
+    row['applicationName'] = app['applicationName']
+    return row
+
+
+def crawl_environment(client, app, env) -> Any:
+    """Fetch connectors, rulesets and jobs of one environment and join them into metadata rows"""
+    conn_lst = get_connectors(client, env['environmentId'])
+    rule_lst = get_rulesets(client, env['environmentId'])
+    jobs_lst = get_jobs(client, env['environmentId'])
+
+    return list(join_rows(app, env, conn_lst, index_by(rule_lst, 'databaseConnectorId'),
+                          index_by(jobs_lst, 'rulesetId')))
+
+
+def iter_crawl_rows(client) -> Any:
+    """Yield metadata rows environment by environment, crawl_workers environments in flight"""
+    with ThreadPoolExecutor(max_workers=crawl_workers) as executor:
+        in_flight = set()
+        for app in iter_pages(client, '/applications', 'Extract applications', verify=verifyCert):
+            env_lst = get_environments(client, app)
+            if not env_lst:
+                yield empty_row(app)
+
+            for env in env_lst:
+                if len(in_flight) >= crawl_workers * 2:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from future.result()
+                in_flight.add(executor.submit(crawl_environment, client, app, env))
+
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+
+
+def collect_rows_async(client) -> Any:
+    """Crawl mode on one event loop with AsyncEngineClient, returns the rows in application order.
+
+    Reuses the token of the sync client and keeps crawl_workers requests in
+    flight over one keep-alive connection pool, instead of one thread per
+    environment.
+    """
+    import asyncio
+    from dlpx_client import AsyncEngineClient, gather_limited
+
+    async def crawl():
+        client.ensure_login()
+        async with AsyncEngineClient(client.host, client.user, client.password, api_path=client.api_path,
+                                     token_ttl=client.token_ttl, limit_per_host=crawl_workers,
+                                     retry=client.retry, req_headers=client.req_headers) as aclient:
+
+            async def environments(app):
+                env_extract = await aclient.get('/environments', params={'page_size': 5000,
+                                                                         'application_id': app['applicationId']})
+                if env_extract.status_code == 404:
+                    return []
+                api_call_status('Extract environments', env_extract)
+                return json.loads(env_extract.text)['responseList']
+
+            async def environment_rows(app, env):
+                params_post = {'environment_id': env['environmentId']}
+                conn_lst, rule_lst, pj_lst, mj_lst = await asyncio.gather(
+                    aclient.get_all_pages('/database-connectors', 'Extract connectors', params_post),
+                    aclient.get_all_pages('/database-rulesets', 'Extract rulesets', params_post),
+                    aclient.get_all_pages('/profile-jobs', 'Extract profile jobs', params_post),
+                    aclient.get_all_pages('/masking-jobs', 'Extract masking jobs', params_post))
+                return list(join_rows(app, env, [connector_entry(conn) for conn in conn_lst],
+                                      index_by([ruleset_entry(rs) for rs in rule_lst], 'databaseConnectorId'),
+                                      index_by(pair_jobs(pj_lst, mj_lst), 'rulesetId')))
+
+            apps = await aclient.get_all_pages('/applications', 'Extract applications')
+            env_lsts = await gather_limited(crawl_workers, [environments(app) for app in apps])
+            env_rows = iter(await gather_limited(crawl_workers, [environment_rows(app, env) for app, env_lst
+                                                                 in zip(apps, env_lsts) for env in env_lst]))
+            rows = []
+            for app, env_lst in zip(apps, env_lsts):
+                if not env_lst:
+                    rows.append(empty_row(app))
+                for env in env_lst:
+                    rows += next(env_rows)
+            return rows
+
+    return asyncio.run(crawl())
+
+
+def iter_engine_rows(client) -> Any:
+    """Bulk mode: page through connectors, rulesets and jobs of the whole engine once and yield the rows.
+
+    Needs a fixed number of paged list calls regardless of the number of
+    environments; only the small id indexes are held in memory.
+    """
+    conn_by_env = index_by(get_connectors(client), 'environmentId')
+    rules_by_conn = index_by(get_rulesets(client), 'databaseConnectorId')
+    jobs_by_rule = index_by(get_jobs(client), 'rulesetId')
+
+    env_by_app = {}
+    for env in iter_pages(client, '/environments', 'Extract environments', verify=verifyCert):
+        env_by_app.setdefault(env.get('applicationId'), []).append(env)
+
+    for app in iter_pages(client, '/applications', 'Extract applications', verify=verifyCert):
+        env_lst = env_by_app.get(app['applicationId'], [])
+        if not env_lst:
+            yield empty_row(app)
+        for env in env_lst:
+            yield from join_rows(app, env, conn_by_env.get(env['environmentId'], []), rules_by_conn, jobs_by_rule)
+
+
+def extract_app_environments(bulk=False) -> Any:
+    """Create environment lookup from source engine.
+
+    Environments are crawled by crawl_workers threads over one pooled session
+    and their rows are appended to metadata as each environment completes;
+    with bulk the whole engine is paged through once instead.
+    """
+    global args, dlpx_host, bkp_loc, sync_operation, baseurl, datestamp, ext_file_names, verifyCert, metadata
 
     logger = logging.getLogger(__name__)
 
-    logger.info("Delphix API authentication ")
+    client = authenticate_api()
 
-    a_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    r_check = a_socket.connect_ex((dlpx_host, 80))
-
-    if r_check == 0:
-        baseurl = baseurl_80
-    else:
-        baseurl = baseurl_443
-    a_socket.close()
+    logger.info("Creating environments lookup from source engine!")
+    print("Creating environments lookup from source engine!")
 
-    req_headers = {'Content-Type': 'application/json'}
+    rows = iter_engine_rows(client) if bulk else iter_crawl_rows(client)
+    for row in rows:
+        metadata.append(row)
 
-    session = requests.session()
-    formdata = '{ "type": "LoginRequest", "username": "' + dlpx_user + '", "password": "' + dlpx_pass + '" }'
-    request = session.post(baseurl + '/login', data=formdata, headers=req_headers, allow_redirects=False, verify=False)
-    api_call_status('authenticating', request)
-    j = json.loads(request.text)
-    authapi = j['Authorization']
+    return metadata
 
-    req_headers = {'Accept': 'application/json', 'Authorization': authapi}
-    return session, req_headers
 
+def write_metadata(rows, output, output_format='csv', fieldnames=METADATA_FIELDS) -> int:
+    """Stream metadata rows to a CSV or JSON lines file, returns the number of rows written"""
+    count = 0
+    with open(output, 'w', newline='') as fOutput:
+        if output_format == 'csv':
+            writer = csv.DictWriter(fOutput, fieldnames=fieldnames, extrasaction='ignore')
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in rows:
+                fOutput.write(json.dumps(row) + '\n')
+                count += 1
+    return count
 
-def extract_app_environments() -> Any:
-    """Create environment lookup from source engine"""
-    global args, dlpx_host, bkp_loc, sync_operation, baseurl, datestamp, ext_file_names, verifyCert, metadata
 
-    logger = logging.getLogger(__name__)
+def connector_entry(conn) -> Any:
+    conn_tmp = {}
+    conn_tmp['environmentId'] = conn['environmentId']
+    conn_tmp['databaseConnectorId'] = conn['databaseConnectorId']
+    conn_tmp['connectorName'] = conn['connectorName']
+    conn_tmp['databaseName'] = conn['databaseName']
+    conn_tmp['databaseType'] = conn['databaseType']
+    conn_tmp['schemaName'] = conn['schemaName']
+    return conn_tmp
 
-    session, req_headers = authenticate_api()
 
-    logger.info("Creating environments lookup from source engine!")
-    print("Creating environments lookup from source engine!")
-
-    a_path_var = '/applications'
-    a_params_post = {'page_size': 5000}
-    app_extract = session.get(baseurl + a_path_var, headers=req_headers, params=a_params_post, verify=verifyCert)
-
-    api_call_status('Extract applications', app_extract)
-    app_lst_tmp = json.loads(app_extract.text)
-    app_lst = app_lst_tmp['responseList']
-
-    params_post = {'page_size': 5000}
-    for app in app_lst:
-        metadata_tmp['applicationName'] = app['applicationName']
-        path_var = '/environments?appliation_id=' + app['applicationId']
-        env_extract = session.get(baseurl + path_var, headers=req_headers, params=params_post, verify=verifyCert)
-        if env_extract.status_code == 404:
-            metadata_tmp['environmentName'] = ''
-            metadata_tmp['connectorName'] = ''
-            metadata_tmp['rulesetName'] = ''
-            metadata_tmp['databaseName'] = ''
-            metadata_tmp['schemaName'] = ''
-            metadata_tmp['databaseType'] = ''
-            metadata_tmp['profileJobId'] = ''
-            metadata_tmp['maskingJobId'] = ''
-            continue
-        else:
-            env_lst_tmp = json.loads(env_extract.text)
-            for env in env_lst_tmp['responseList']:
-                metadata_tmp['environmentName'] = env['environmentName']
-
-                conn_lst = get_connectors(session, req_headers,env['environmentId'])
-                rule_lst = get_rulesets(session, req_headers, env['environmentId'])
-                jobs_lst = get_jobs(session, req_headers, env['environmentId'])
-
-                for conn in conn_lst:
-                    metadata_tmp['connectorName'] = conn['connectorName']
-                    metadata_tmp['databaseName'] = conn['databaseName']
-                    metadata_tmp['schemaName'] = conn['schemaName']
-                    metadata_tmp['databaseType'] = conn['databaseType']
-
-                    for rule in rule_lst:
-                        if conn['databaseConnectorId'] == rule['databaseConnectorId']:
-                            metadata_tmp['rulesetName'] = rule['rulesetName']
-                            for job in jobs_lst:
-                                if rule['rulesetId'] == job['rulesetId']:
-                                    metadata_tmp['profileJobId'] = job['profileJobId']
-                                    metadata_tmp['maskingJobId'] = job['maskingJobId']
-
-        metadata.append(metadata_tmp)
-
-def get_connectors(session, req_headers, environmentId) -> Any:
+def get_connectors(client, environmentId=None) -> Any:
     global dlpx_host, bkp_loc, baseurl, verifyCert
 
     logger = logging.getLogger(__name__)
-    logger.info("Get source environment ID for OTF jobs")
+    logger.info("Get connectors of environment " + str(environmentId))
 
-    path_var = '/database-connectors/?environment_id=' + str(environmentId)
-    params_post = {'page_size': 5000}
+    conn_lst = []
+    params_post = {'environment_id': environmentId} if environmentId is not None else {}
 
-    extract_exec = session.get(baseurl + path_var, params=params_post, headers=req_headers, verify=verifyCert)
-    extract_info = json.loads(extract_exec.text)
-
-    for conn in extract_info['responseList']:
-        conn_tmp['environmentId'] = conn['environmentId']
-        conn_tmp['databaseConnectorId'] = conn['databaseConnectorId']
-        conn_tmp['connectorName'] = conn['connectorName']
-        conn_tmp['databaseName'] = conn['databaseName']
-        conn_tmp['databaseType'] = conn['databaseType']
-        conn_tmp['schemaName'] = conn['schemaName']
-
-        conn_lst.append(conn_tmp)
+    for conn in iter_pages(client, '/database-connectors', 'Extract connectors', params_post, verify=verifyCert):
+        conn_lst.append(connector_entry(conn))
 
     return conn_lst
 
-def get_rulesets(session, req_headers, environmentId) -> Any:
+def get_rulesets(client, environmentId=None) -> Any:
     global dlpx_host, bkp_loc, baseurl, verifyCert
 
     logger = logging.getLogger(__name__)
-    logger.info("Get source environment ID for OTF jobs")
+    logger.info("Get rulesets of environment " + str(environmentId))
 
-    path_var = '/database-rulesets/?environment_id=' + str(environmentId)
-    params_post = {'page_size': 5000}
+    rs_lst = []
+    params_post = {'environment_id': environmentId} if environmentId is not None else {}
 
-    extract_exec = session.get(baseurl + path_var, params=params_post, headers=req_headers, verify=verifyCert)
-    extract_info = json.loads(extract_exec.text)
-
-    for rs in extract_info['responseList']:
-        rs_tmp['databaseConnectorId'] = rs['databaseConnectorId']
-        rs_tmp['rulesetName'] = rs['rulesetName']
-        rs_tmp['rulesetId'] = rs['databaseRulesetId']
-        rs_lst.append(rs_tmp)
+    for rs in iter_pages(client, '/database-rulesets', 'Extract rulesets', params_post, verify=verifyCert):
+        rs_lst.append(ruleset_entry(rs))
 
     return rs_lst
 
-def get_jobs(session, req_headers, environmentId) -> Any:
+def ruleset_entry(rs) -> Any:
+    rs_tmp = {}
+    rs_tmp['databaseConnectorId'] = rs['databaseConnectorId']
+    rs_tmp['rulesetName'] = rs['rulesetName']
+    rs_tmp['rulesetId'] = rs['databaseRulesetId']
+    return rs_tmp
+
+def get_jobs(client, environmentId=None) -> Any:
     global dlpx_host, bkp_loc, baseurl, verifyCert
 
     logger = logging.getLogger(__name__)
-    logger.info("Get source environment ID for OTF jobs")
+    logger.info("Get profile and masking jobs of environment " + str(environmentId))
 
-    path_var = '/profile-jobs/?environment_id=' + str(environmentId)
-    params_post = {'page_size': 5000}
+    params_post = {'environment_id': environmentId} if environmentId is not None else {}
 
-    extract_exec = session.get(baseurl + path_var, params=params_post, headers=req_headers, verify=verifyCert)
-    extract_info = json.loads(extract_exec.text)
+    return pair_jobs(iter_pages(client, '/profile-jobs', 'Extract profile jobs', params_post, verify=verifyCert),
+                     iter_pages(client, '/masking-jobs', 'Extract masking jobs', params_post, verify=verifyCert))
 
-    for pj in extract_info['responseList']:
+
+def pair_jobs(profile_jobs, masking_jobs) -> Any:
+    """Job rows of a set of profile and masking jobs, keyed by rulesetId"""
+    pj_lst = []
+    common_lst = []
+
+    for pj in profile_jobs:
+        pj_tmp = {}
         pj_tmp['profileJobId'] = pj['profileJobId']
         pj_tmp['rulesetId'] = pj['rulesetId']
         pj_tmp['maskingJobId'] = ''
 
         pj_lst.append(pj_tmp)
 
-    path_var = '/masking-jobs/?environment_id=' + str(environmentId)
-    params_post = {'page_size': 5000}
+    mj_by_rule = {}
+    for mj in masking_jobs:
+        mj_by_rule.setdefault(mj['rulesetId'], []).append(mj['maskingJobId'])
+
+    """Pair every profile job with every masking job of its ruleset, keep unpaired jobs of either kind"""
+    for pj in pj_lst:
+        for mj_id in mj_by_rule.get(pj['rulesetId'], ['']):
+            common_lst.append({'rulesetId': pj['rulesetId'], 'profileJobId': pj['profileJobId'],
+                               'maskingJobId': mj_id})
+
+    profiled = {pj['rulesetId'] for pj in pj_lst}
+    for ruleset_id, mj_ids in mj_by_rule.items():
+        if ruleset_id not in profiled:
+            for mj_id in mj_ids:
+                common_lst.append({'rulesetId': ruleset_id, 'profileJobId': '', 'maskingJobId': mj_id})
 
-    extract_exec = session.get(baseurl + path_var, params=params_post, headers=req_headers, verify=verifyCert)
-    extract_info = json.loads(extract_exec.text)
+    return common_lst
 
-    for mj in extract_info['responseList']:
-        mj_tmp['profileJobId'] = ''
-        mj_tmp['rulesetId'] = mj['rulesetId']
-        mj_tmp['maskingJobId'] = mj['maskingJobId']
 
-        mj_lst.append(mj_tmp)
+crawl_workers = 8
+verifyCert = False
+metadata = []
 
-    for pj in pj_lst:
-        common_lst_tmp['rulesetId'] = pj['rulesetId']
-        common_lst_tmp['profileJobId'] = pj['profileJobId']
-        common_lst_tmp['maskingJobId'] = ''
 
-        for mj in mj_lst:
-            if pj['rulesetId'] == mj['rulesetId']:
-                common_lst_tmp['maskingJobId'] = mj['maskingJobId']
-                break
-        common_lst.append(common_lst_tmp)
+def main():
+    import argparse
 
-    return common_lst
+    global dlpx_host, dlpx_user, dlpx_pass, crawl_workers
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--dlpxhost", "-dh", required=True, help="Delphix masking engine host")
+    parser.add_argument("--dlpxuser", "-du", required=True, help="Delphix masking engine user")
+    parser.add_argument("--dlpxpass", "-dp", required=True, help="Delphix masking engine password")
+    parser.add_argument("--output", "-o", required=True, help="Output file")
+    parser.add_argument("--format", "-of", default="csv", choices=['csv', 'jsonl'], help="Output format")
+    parser.add_argument("--mode", "-m", default="bulk", choices=['bulk', 'crawl', 'async'],
+                        help="bulk: page through the whole engine, crawl: environment by environment, "
+                             "async: crawl on one asyncio event loop (needs aiohttp)")
+    parser.add_argument("--workers", "-w", type=int, default=crawl_workers, help="Concurrent environments in crawl mode")
+
+    args = parser.parse_args()
+    dlpx_host = args.dlpxhost
+    dlpx_user = args.dlpxuser
+    dlpx_pass = args.dlpxpass
+    crawl_workers = args.workers
+
+    start = time.monotonic()
+    try:
+        client = authenticate_api()
+        if args.mode == 'bulk':
+            rows = iter_engine_rows(client)
+        elif args.mode == 'async':
+            rows = collect_rows_async(client)
+        else:
+            rows = iter_crawl_rows(client)
+        count = write_metadata(rows, args.output, args.format)
+    except EngineApiError as e:
+        logging.getLogger(__name__).info(str(e))
+        print(str(e))
+        exit(1)
+    elapsed = time.monotonic() - start
+
+    print("Exported " + str(count) + " rows to " + args.output + " in " + str(round(elapsed, 1)) + " seconds")
+    logging.getLogger(__name__).info("Exported " + str(count) + " rows in " + str(round(elapsed, 1)) + " seconds")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# ================================================================================
+# File:         bench_dlpx.py
+# Type:         python script
+# Date:         October 18th 2026
+# Author:       Ranjeeth Kashetty
+# Ownership:    This script is owned and maintained by the user, not by Delphix
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+# Description:
+#       Benchmark of inventory collection, inventory comparison, metadata export and a
+#       profiling run against the mock engine at synthetic scales
+#
+# Usage:
+#       ./bench_dlpx.py -s 10,100,1000,10000 -l 0.005 -jd 0.5 -o bench.jsonl
+
+import contextlib
+import io
+import json
+import tempfile
+import time
+
+from typing import Any
+
+import Collect_Metadata
+import execute_dlpx
+from dlpx_client import PollingStrategy
+from mock_engine import MockEngine
+
+MOCK_HOST = 'mock-engine'
+
+
+def timed(scale, operation, engine, work) -> Any:
+    """Run work() with its output suppressed, returns the benchmark row and the result of work"""
+    requests_before = engine.request_count()
+    start = time.monotonic()
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            result = work()
+        except SystemExit as e:
+            result = e.code
+    elapsed = time.monotonic() - start
+
+    row = {'tables': scale, 'operation': operation, 'seconds': round(elapsed, 3),
+           'requests': engine.request_count() - requests_before}
+    return row, result
+
+
+def collect_all_inventories(jobs) -> Any:
+    """record_Inventory of every profile job, returns {job: (tm, cm, ruleset_id)}"""
+    return {job: execute_dlpx.record_Inventory(MOCK_HOST, 'bench', 'bench', job) for job in jobs}
+
+
+def compare_all_inventories(before, after) -> Any:
+    mismatches = []
+    for job, (curr_tm, curr_cm, rset) in before.items():
+        new_tm, new_cm, _ = after[job]
+        mismatches += execute_dlpx.compare_inventory(curr_tm, curr_cm, new_tm, new_cm, rset) or []
+    return mismatches
+
+
+def bench_scale(tables, args) -> Any:
+    """Benchmark rows of every operation against a fresh mock engine with tables tables"""
+    engine = MockEngine.synthetic(tables=tables, columns=args.columns, tables_per_ruleset=args.tables_per_ruleset,
+                                  latency=args.latency, job_duration=args.job_duration, drift=args.drift)
+    jobs = [job['profileJobId'] for job in engine.collections['/profile-jobs']]
+    rows = []
+
+    with engine.installed(MOCK_HOST), tempfile.TemporaryDirectory() as workdir:
+        execute_dlpx.engine_clients.clear()
+        execute_dlpx.dlpx_host, execute_dlpx.dlpx_user, execute_dlpx.dlpx_pass = MOCK_HOST, 'bench', 'bench'
+        execute_dlpx.metadata_workers = args.workers
+        execute_dlpx.inventoryCachePath = workdir + '/inventory_cache/'
+        execute_dlpx.journalPath = workdir + '/refresh_journal.jsonl'
+        execute_dlpx.reportPath = workdir + '/'
+        execute_dlpx.default_polling = PollingStrategy(initial=args.job_duration / 10, cap=max(args.job_duration, 0.1))
+        Collect_Metadata.dlpx_host, Collect_Metadata.dlpx_user, Collect_Metadata.dlpx_pass = MOCK_HOST, 'bench', 'bench'
+        Collect_Metadata.crawl_workers = args.workers
+
+        row, before = timed(tables, 'record_Inventory', engine, lambda: collect_all_inventories(jobs))
+        rows.append(row)
+
+        for job in jobs:
+            engine.apply_drift(job)
+        _, after = timed(tables, 'record_Inventory', engine, lambda: collect_all_inventories(jobs))
+        row, mismatches = timed(tables, 'compare_inventory', engine, lambda: compare_all_inventories(before, after))
+        row['mismatches'] = len(mismatches)
+        rows.append(row)
+
+        for bulk in (True, False):
+            Collect_Metadata.metadata = []
+            row, metadata = timed(tables, 'extract_app_environments ' + ('bulk' if bulk else 'crawl'), engine,
+                                  lambda: Collect_Metadata.extract_app_environments(bulk))
+            row['rows'] = len(metadata)
+            rows.append(row)
+
+        execute_dlpx.pjoblist = [str(job) for job in jobs]
+        row, result = timed(tables, 'execute_profile_mask', engine,
+                            lambda: execute_dlpx.execute_profile_mask('profiling', args.max_in_flight, fail_fast=False))
+        row['jobs'] = len(jobs)
+        row['exit'] = result if not isinstance(result, dict) else 0
+        rows.append(row)
+
+    return rows
+
+
+def print_rows(rows) -> Any:
+    for row in rows:
+        print('{:>8}  {:<34}{:>10.3f}{:>10}'.format(row['tables'], row['operation'], row['seconds'], row['requests']))
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--scales", "-s", default="10,100,1000,10000", help="Comma separated table counts")
+    parser.add_argument("--columns", "-c", type=int, default=8, help="Columns per table")
+    parser.add_argument("--tables-per-ruleset", "-tr", type=int, default=100, help="Tables per ruleset and job")
+    parser.add_argument("--latency", "-l", type=float, default=0.005, help="Mock engine latency per request, seconds")
+    parser.add_argument("--job-duration", "-jd", type=float, default=0.5, help="Mock execution duration, seconds")
+    parser.add_argument("--drift", "-d", type=float, default=0.01,
+                        help="Fraction of columns changed by a profiling run")
+    parser.add_argument("--workers", "-w", type=int, default=8, help="Concurrent metadata requests")
+    parser.add_argument("--max-in-flight", "-mf", type=int, default=8, help="Jobs running concurrently")
+    parser.add_argument("--output", "-o", help="Also write the results to this JSON lines file")
+
+    args = parser.parse_args()
+
+    print('{:>8}  {:<34}{:>10}{:>10}'.format('tables', 'operation', 'seconds', 'requests'))
+    rows = []
+    for scale in args.scales.split(','):
+        scale_rows = bench_scale(int(scale), args)
+        print_rows(scale_rows)
+        rows += scale_rows
+
+    if args.output:
+        with open(args.output, 'w') as fOutput:
+            for row in rows:
+                fOutput.write(json.dumps(row) + '\n')
+
+
+if __name__ == '__main__':
+    main()
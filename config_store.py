@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# ================================================================================
+# File:         config_store.py
+# Type:         python module
+# Date:         October 18th 2026
+# Author:       Ranjeeth Kashetty
+# Ownership:    This script is owned and maintained by the user, not by Delphix
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+# Description:
+#       Store for the dlpx_mask configuration (hyper_config.json): settings sections and
+#       database entries indexed by (name, db_type), safe for concurrent onboarding runs
+#
+# Prerequisites:
+#       1. JSON backend: fcntl (POSIX) for locking, without it writes are not locked
+#       2. SQLite backend: used for config paths ending in .db or .sqlite
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+
+from typing import Any
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def db_key(name, db_type) -> Any:
+    return name, db_type.upper()
+
+
+class JsonConfigStore:
+    """hyper_config.json with an index of the database entries by (name, db_type).
+
+    The file is parsed again only when its modification time changed. Every
+    update takes an exclusive lock on <path>.lock, re-reads the file, applies
+    the change and replaces the file atomically, so concurrent runs do not
+    lose each other's updates. Use transaction() to group several updates
+    into one rewrite.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self.thread_lock = threading.RLock()
+        self.data = None
+        self.index = {}
+        self.mtime = None
+        self.in_transaction = False
+
+    def load(self) -> dict:
+        mtime = os.stat(self.path).st_mtime_ns
+        if self.data is None or mtime != self.mtime:
+            with open(self.path) as fConfig:
+                self.data = json.load(fConfig)
+            self.data.setdefault('database', [])
+            self.index = {db_key(d['name'], d['db_type']): d for d in self.data['database']}
+            self.mtime = mtime
+        return self.data
+
+    def section(self, name) -> Any:
+        with self.thread_lock:
+            return self.load()[name]
+
+    def databases(self) -> list:
+        with self.thread_lock:
+            return list(self.load()['database'])
+
+    def get_database(self, name, db_type) -> Any:
+        with self.thread_lock:
+            self.load()
+            return self.index.get(db_key(name, db_type))
+
+    def transaction(self) -> Any:
+        """Context manager yielding the locked, freshly read config; written back atomically on exit"""
+        return _JsonTransaction(self)
+
+    def upsert_database(self, entry) -> dict:
+        """Add a database entry or replace the one with the same name and db_type"""
+        with self.transaction():
+            current = self.index.get(db_key(entry['name'], entry['db_type']))
+            if current is None:
+                self.data['database'].append(entry)
+            else:
+                self.data['database'][self.data['database'].index(current)] = entry
+            self.index[db_key(entry['name'], entry['db_type'])] = entry
+        return entry
+
+    def update_database(self, name, db_type, **fields) -> Any:
+        """Set fields of an existing database entry, returns the entry or None when there is none"""
+        with self.transaction():
+            entry = self.index.get(db_key(name, db_type))
+            if entry is not None:
+                entry.update(fields)
+        return entry
+
+    def update_schema(self, name, db_type, schema, **fields) -> Any:
+        """Set fields of one schema in the schema_config of a database entry"""
+        with self.transaction():
+            entry = self.index.get(db_key(name, db_type))
+            if entry is not None:
+                entry.setdefault('schema_config', {}).setdefault(schema, {}).update(fields)
+        return entry
+
+    def update_section(self, name, **fields) -> Any:
+        with self.transaction():
+            self.data[name].update(fields)
+            return self.data[name]
+
+    def write(self) -> Any:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.hyper_config.')
+        try:
+            with os.fdopen(fd, 'w') as fConfig:
+                json.dump(self.data, fConfig, indent=4)
+                fConfig.flush()
+                os.fsync(fConfig.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.mtime = os.stat(self.path).st_mtime_ns
+
+
+class _JsonTransaction:
+    def __init__(self, store):
+        self.store = store
+        self.owner = False
+        self.lock_file = None
+
+    def __enter__(self):
+        self.store.thread_lock.acquire()
+        if self.store.in_transaction:
+            return self.store.data
+        self.owner = True
+        self.store.in_transaction = True
+        self.lock_file = open(self.store.lock_path, 'a')
+        if fcntl is not None:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        self.store.data = None
+        return self.store.load()
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self.owner:
+                try:
+                    if exc_type is None:
+                        self.store.write()
+                    else:
+                        """Drop the in-memory changes, the next read loads the file again"""
+                        self.store.data = None
+                finally:
+                    self.store.in_transaction = False
+                    if fcntl is not None:
+                        fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+                    self.lock_file.close()
+        finally:
+            self.store.thread_lock.release()
+
+
+class SqliteConfigStore:
+    """The same store kept in SQLite: one row per section and per database entry.
+
+    Updates touch only their own row and SQLite serialises writers, so many
+    onboarding runs can update their entries in parallel. An empty database
+    is seeded from json_path when that file exists.
+    """
+
+    def __init__(self, path, json_path=None):
+        self.path = path
+        self.local = threading.local()
+        conn = self.connection()
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS sections (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS databases (name TEXT NOT NULL, db_type TEXT NOT NULL, "
+                         "entry TEXT NOT NULL, PRIMARY KEY (name, db_type))")
+        if json_path is not None and os.path.isfile(json_path):
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                if conn.execute("SELECT COUNT(*) FROM sections").fetchone()[0] == 0:
+                    self.import_json(json_path)
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn = conn
+        return conn
+
+    def import_json(self, json_path) -> Any:
+        with open(json_path) as fConfig:
+            data = json.load(fConfig)
+        conn = self.connection()
+        with conn:
+            for name, value in data.items():
+                if name != 'database':
+                    conn.execute("INSERT OR REPLACE INTO sections VALUES (?, ?)", (name, json.dumps(value)))
+            for entry in data.get('database', []):
+                conn.execute("INSERT OR REPLACE INTO databases VALUES (?, ?, ?)",
+                             db_key(entry['name'], entry['db_type']) + (json.dumps(entry),))
+
+    def section(self, name) -> Any:
+        row = self.connection().execute("SELECT value FROM sections WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        return json.loads(row[0])
+
+    def databases(self) -> list:
+        return [json.loads(row[0]) for row in self.connection().execute("SELECT entry FROM databases")]
+
+    def get_database(self, name, db_type) -> Any:
+        row = self.connection().execute("SELECT entry FROM databases WHERE name = ? AND db_type = ?",
+                                        db_key(name, db_type)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def upsert_database(self, entry) -> dict:
+        with self.connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO databases VALUES (?, ?, ?)",
+                         db_key(entry['name'], entry['db_type']) + (json.dumps(entry),))
+        return entry
+
+    def update_database(self, name, db_type, **fields) -> Any:
+        return self.modify_database(name, db_type, lambda entry: entry.update(fields))
+
+    def update_schema(self, name, db_type, schema, **fields) -> Any:
+        def change(entry):
+            entry.setdefault('schema_config', {}).setdefault(schema, {}).update(fields)
+        return self.modify_database(name, db_type, change)
+
+    def modify_database(self, name, db_type, change) -> Any:
+        """Apply change(entry) to a database entry, returns the entry or None when there is none"""
+        conn = self.connection()
+        with conn:
+            """BEGIN IMMEDIATE takes the write lock before the read, so the read-modify-write is atomic"""
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT entry FROM databases WHERE name = ? AND db_type = ?",
+                               db_key(name, db_type)).fetchone()
+            if row is None:
+                return None
+            entry = json.loads(row[0])
+            change(entry)
+            conn.execute("UPDATE databases SET entry = ? WHERE name = ? AND db_type = ?",
+                         (json.dumps(entry),) + db_key(name, db_type))
+        return entry
+
+    def update_section(self, name, **fields) -> Any:
+        conn = self.connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            value = self.section(name)
+            value.update(fields)
+            conn.execute("UPDATE sections SET value = ? WHERE name = ?", (json.dumps(value), name))
+        return value
+
+
+def open_config_store(path, json_path=None) -> Any:
+    """SqliteConfigStore for .db / .sqlite paths, JsonConfigStore otherwise.
+
+    A new SQLite store is seeded from json_path, by default the .json file
+    next to it with the same name.
+    """
+    if path.endswith(('.db', '.sqlite')):
+        return SqliteConfigStore(path, json_path or os.path.splitext(path)[0] + '.json')
+    return JsonConfigStore(path)
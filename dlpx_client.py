@@ -0,0 +1,614 @@
+#!/usr/bin/env python3
+# ================================================================================
+# File:         dlpx_client.py
+# Type:         python module
+# Date:         October 18th 2026
+# Author:       Ranjeeth Kashetty
+# Ownership:    This script is owned and maintained by the user, not by Delphix
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+# Description:
+#       Engine API client shared by execute_dlpx, Collect_Metadata, dlpx_mask and fleet_dlpx:
+#       error model, retries, scheme discovery, metrics, pooled sync client and asyncio client
+#
+# Prerequisites:
+#       1. requests; aiohttp only for AsyncEngineClient
+
+import json
+import os
+import random
+import re
+import socket
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+from typing import Any, NamedTuple, Optional
+
+import logging
+
+
+class EngineApiError(Exception):
+    """A masking engine API call failed"""
+
+    def __init__(self, func_name, status_code, message):
+        super().__init__(f"Request in operation {func_name} failed with status code {status_code}: {message}")
+        self.func_name = func_name
+        self.status_code = status_code
+        self.message = message
+
+
+class TransientApiError(EngineApiError):
+    """429, 5xx or a connection problem, the call may succeed when retried"""
+
+
+class FatalApiError(EngineApiError):
+    """4xx, retrying the same call will not help"""
+
+
+def api_call_status(func_name, request):
+    status_code = request.status_code
+    status_msg = request.text
+    if status_code != 200:
+        logging.info(f"Request in operation {func_name} failed with status code {status_code}")
+        logging.info(f"Message: {status_msg}")
+        if status_code == 429 or status_code >= 500:
+            raise TransientApiError(func_name, status_code, status_msg)
+        raise FatalApiError(func_name, status_code, status_msg)
+    else:
+        logging.info(f"Request in Function {func_name} succeeds with status code {status_code}")
+
+
+class RetryPolicy:
+    """Exponential backoff with jitter for transient engine API failures.
+
+    429 and 5xx responses and connection errors are retried up to attempts
+    times, other errors are returned at once. Non idempotent requests (POSTs
+    other than /login), which may have launched something before failing, are
+    only retried when the engine refused them outright (429, 503).
+    """
+
+    def __init__(self, attempts=5, initial=1.0, factor=2.0, cap=30.0):
+        self.attempts = attempts
+        self.initial = initial
+        self.factor = factor
+        self.cap = cap
+
+    def retriable(self, idempotent, status_code) -> bool:
+        if not idempotent:
+            return status_code in (429, 503)
+        return status_code == 429 or status_code >= 500
+
+    def delay(self, attempt, response=None) -> float:
+        if response is not None and response.headers.get('Retry-After', '').isdigit():
+            return min(self.cap, float(response.headers['Retry-After']))
+        return min(self.cap, self.initial * self.factor ** attempt) * random.uniform(0.5, 1.0)
+
+
+default_retry = RetryPolicy()
+
+
+class PollingStrategy:
+    """Delay between execution polls: fast first polls, exponential backoff with jitter, capped.
+
+    With use_progress the rate observed between two polls (rowsMasked against
+    rowsTotal of /executions/{id}) is used to predict when the execution will
+    finish, and the next poll is scheduled then (still within initial..cap).
+    """
+
+    def __init__(self, initial=1.0, factor=2.0, cap=60.0, jitter=0.1, use_progress=True):
+        self.initial = initial
+        self.factor = factor
+        self.cap = cap
+        self.jitter = jitter
+        self.use_progress = use_progress
+
+    def next_delay(self, state, ex_info=None) -> float:
+        """Return seconds until the next poll; state is a per-execution dict kept by the caller"""
+        attempt = state.get('attempt', 0)
+        state['attempt'] = attempt + 1
+        delay = min(self.cap, self.initial * self.factor ** attempt)
+
+        if self.use_progress and ex_info is not None:
+            estimate = self.estimate_remaining(state, ex_info)
+            if estimate is not None:
+                delay = max(self.initial, min(self.cap, estimate))
+
+        if self.jitter:
+            delay = delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+        return delay
+
+    def estimate_remaining(self, state, ex_info) -> Optional[float]:
+        """Seconds until completion extrapolated from row progress, None if unknown"""
+        done = ex_info.get('rowsMasked')
+        total = ex_info.get('rowsTotal')
+        now = time.monotonic()
+        prev_done, prev_time = state.get('rows', (None, None))
+        state['rows'] = (done, now)
+
+        if not done or not total or prev_done is None or done <= prev_done:
+            return None
+        rate = (done - prev_done) / (now - prev_time)
+        return (total - done) / rate
+
+
+default_polling = PollingStrategy()
+
+
+scheme_cache = {}
+scheme_lock = threading.Lock()
+scheme_host_locks = {}
+scheme_probe_timeout = 3
+scheme_cache_ttl = 86400
+schemeCachePath = None
+
+# When set, mounted on every EngineClient session instead of a pooled HTTPAdapter (see mock_engine)
+transport_adapter = None
+
+
+def probe_scheme(host) -> str:
+    """Return 'http' when port 80 of the host accepts connections, else 'https'.
+
+    The probe has a scheme_probe_timeout second timeout and its answer is
+    cached for scheme_cache_ttl seconds in memory and, when schemeCachePath
+    is set, in that JSON file so other processes skip the probe too.
+    Concurrent calls for one host share a probe; different hosts are probed
+    in parallel.
+    """
+    logger = logging.getLogger(__name__)
+
+    with scheme_lock:
+        host_lock = scheme_host_locks.setdefault(host, threading.Lock())
+
+    with host_lock:
+        now = time.time()
+        if host in scheme_cache and now - scheme_cache[host][1] < scheme_cache_ttl:
+            return scheme_cache[host][0]
+
+        disk_cache = read_scheme_cache()
+        if host in disk_cache and now - disk_cache[host][1] < scheme_cache_ttl:
+            scheme_cache[host] = tuple(disk_cache[host])
+            return scheme_cache[host][0]
+
+        a_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        a_socket.settimeout(scheme_probe_timeout)
+        try:
+            r_check = a_socket.connect_ex((host, 80))
+        except OSError:
+            r_check = -1
+        a_socket.close()
+
+        scheme = 'http' if r_check == 0 else 'https'
+        logger.info("Engine " + str(host) + " uses " + scheme)
+
+        with scheme_lock:
+            scheme_cache[host] = (scheme, now)
+            if schemeCachePath is not None:
+                """Re-read the file so answers saved for other hosts meanwhile are kept"""
+                disk_cache = read_scheme_cache()
+                disk_cache[host] = scheme_cache[host]
+                with open(schemeCachePath + '.tmp', 'w') as fCache:
+                    json.dump(disk_cache, fCache)
+                os.replace(schemeCachePath + '.tmp', schemeCachePath)
+
+        return scheme
+
+
+def read_scheme_cache() -> dict:
+    if schemeCachePath is None or not os.path.isfile(schemeCachePath):
+        return {}
+    with open(schemeCachePath) as fCache:
+        return json.load(fCache)
+
+
+class Metrics:
+    """Per-job timings and per-endpoint engine API latency histograms of a run"""
+    LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.api = {}
+
+    def observe_api(self, method, url_ext, seconds, status_code) -> Any:
+        """Record one API call; ids in the path are folded so /executions/12 and /executions/13 share a histogram"""
+        endpoint = re.sub(r'/\d+', '/{id}', url_ext.split('?')[0].rstrip('/'))
+        with self.lock:
+            api = self.api.setdefault((method, endpoint), {'buckets': [0] * len(self.LATENCY_BUCKETS),
+                                                           'count': 0, 'sum': 0.0, 'errors': 0})
+            for i, bound in enumerate(self.LATENCY_BUCKETS):
+                if seconds <= bound:
+                    api['buckets'][i] += 1
+            api['count'] += 1
+            api['sum'] += seconds
+            if status_code != 200:
+                api['errors'] += 1
+
+    def job_event(self, host, task, event, result=None) -> Any:
+        """Record the queued, started or ended time of a job, with rows and throughput from its result"""
+        indicator, job = task
+        with self.lock:
+            record = self.jobs.setdefault((host, indicator, str(job)), {'engine': host, 'indicator': indicator,
+                                                                        'job': job})
+            record[event] = time.time()
+            if result is not None:
+                record['executionId'] = result.get('executionId', record.get('executionId'))
+                record['status'] = result.get('status', record.get('status'))
+                rows = result.get('rows')
+                if rows is not None:
+                    record['rows'] = rows
+                if event == 'ended' and 'started' in record:
+                    record['duration'] = record['ended'] - record['started']
+                    if record.get('rows') and record['duration'] > 0:
+                        record['rowsPerSecond'] = record['rows'] / record['duration']
+
+    def report(self) -> Any:
+        with self.lock:
+            api = []
+            for (method, endpoint), values in sorted(self.api.items()):
+                api.append({'method': method, 'endpoint': endpoint, 'count': values['count'],
+                            'errors': values['errors'], 'sum': values['sum'],
+                            'mean': values['sum'] / values['count'] if values['count'] else 0,
+                            'buckets': dict(zip(map(str, self.LATENCY_BUCKETS), values['buckets']))})
+            return {'jobs': [dict(record) for record in self.jobs.values()], 'api': api}
+
+    def write_json(self, path) -> Any:
+        with open(path, 'w') as fMetrics:
+            json.dump(self.report(), fMetrics, indent=4)
+
+    def write_prometheus(self, path) -> Any:
+        """Write the metrics in Prometheus text exposition format, e.g. for the node exporter textfile collector"""
+        report = self.report()
+        lines = ['# HELP dlpx_api_request_duration_seconds Latency of masking engine API calls',
+                 '# TYPE dlpx_api_request_duration_seconds histogram']
+        for api in report['api']:
+            labels = 'method="' + api['method'] + '",endpoint="' + api['endpoint'] + '"'
+            for bound, count in api['buckets'].items():
+                lines.append('dlpx_api_request_duration_seconds_bucket{' + labels + ',le="' + bound + '"} ' + str(count))
+            lines.append('dlpx_api_request_duration_seconds_bucket{' + labels + ',le="+Inf"} ' + str(api['count']))
+            lines.append('dlpx_api_request_duration_seconds_sum{' + labels + '} ' + str(api['sum']))
+            lines.append('dlpx_api_request_duration_seconds_count{' + labels + '} ' + str(api['count']))
+
+        job_gauges = (('dlpx_job_duration_seconds', 'Execution time of a job', lambda job: job.get('duration')),
+                      ('dlpx_job_queue_seconds', 'Time a job waited before it was launched',
+                       lambda job: job['started'] - job['queued'] if 'queued' in job and 'started' in job else None),
+                      ('dlpx_job_rows', 'Rows processed by a job', lambda job: job.get('rows')),
+                      ('dlpx_job_rows_per_second', 'Throughput of a job', lambda job: job.get('rowsPerSecond')))
+        for name, help_text, value in job_gauges:
+            lines += ['# HELP ' + name + ' ' + help_text, '# TYPE ' + name + ' gauge']
+            for job in report['jobs']:
+                if value(job) is not None:
+                    lines.append(name + '{engine="' + str(job['engine']) + '",indicator="' + job['indicator'] +
+                                 '",job="' + str(job['job']) + '"} ' + str(value(job)))
+
+        with open(path, 'w') as fMetrics:
+            fMetrics.write('\n'.join(lines) + '\n')
+
+
+metrics = Metrics()
+
+
+class EngineClient:
+    """Authenticated, connection-pooled session against a single masking engine.
+
+    Logs in once and keeps the Authorization token; a new login is only done when
+    the token is older than token_ttl seconds or the engine answers with a 401.
+    With api_key the 'apk' Authorization header is used instead of a login.
+    Transient failures are retried according to the retry policy.
+    """
+
+    def __init__(self, host, user=None, password=None, api_path='/masking/api', token_ttl=1800, pool_size=10,
+                 retry=None, api_key=None):
+        self.host = host
+        self.user = user
+        self.password = password
+        self.api_key = api_key
+        self.api_path = api_path
+        self.token_ttl = token_ttl
+        self.retry = retry if retry is not None else default_retry
+        self.baseurl = None
+        self.req_headers = None
+        self.login_time = 0.0
+        self.lock = threading.Lock()
+
+        self.session = requests.session()
+        adapter = transport_adapter
+        if adapter is None:
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def login(self) -> Any:
+        """Resolve the engine scheme and fetch a fresh Authorization token"""
+        logger = logging.getLogger(__name__)
+
+        logger.info("Delphix API authentication ")
+
+        self.baseurl = probe_scheme(self.host) + '://' + self.host + self.api_path
+
+        if self.api_key is not None:
+            self.req_headers = {'Accept': 'application/json', 'Authorization': 'apk ' + str(self.api_key)}
+            self.login_time = float('inf')
+            return
+
+        req_headers = {'Content-Type': 'application/json'}
+
+        formdata = '{ "type": "LoginRequest", "username": "' + self.user + '", "password": "' + self.password + '" }'
+        request = self.timed_request('POST', '/login', req_headers, idempotent=True, data=formdata,
+                                     allow_redirects=False, verify=False)
+        api_call_status('authenticating', request)
+        j = json.loads(request.text)
+
+        self.req_headers = {'Accept': 'application/json', 'Authorization': j['Authorization']}
+        self.login_time = time.monotonic()
+
+    def ensure_login(self, force=False) -> Any:
+        with self.lock:
+            if force or self.req_headers is None or time.monotonic() - self.login_time > self.token_ttl:
+                self.login()
+
+    def request(self, method, url_ext, **kwargs) -> Any:
+        """Send a request relative to the engine API, re-authenticating once on a 401"""
+        logger = logging.getLogger(__name__)
+
+        kwargs.setdefault('verify', False)
+        self.ensure_login()
+        headers = self.req_headers
+        response = self.timed_request(method, url_ext, headers, **kwargs)
+        if response.status_code == 401:
+            logger.info("Authorization token rejected, re-authenticating")
+            with self.lock:
+                # another thread may already have refreshed the token
+                if self.req_headers is headers:
+                    self.login()
+            response = self.timed_request(method, url_ext, self.req_headers, **kwargs)
+        return response
+
+    def timed_request(self, method, url_ext, headers, idempotent=None, **kwargs) -> Any:
+        """Send one request with retries on transient failures, recording the latency of each attempt"""
+        logger = logging.getLogger(__name__)
+
+        if idempotent is None:
+            idempotent = method != 'POST'
+
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            try:
+                response = self.session.request(method, self.baseurl + url_ext, headers=headers, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                metrics.observe_api(method, url_ext, time.monotonic() - start, 0)
+                if attempt + 1 >= self.retry.attempts or not (idempotent or
+                                                               isinstance(e, requests.exceptions.ConnectTimeout)):
+                    raise TransientApiError(method + ' ' + url_ext, 0, str(e))
+                response = None
+            else:
+                metrics.observe_api(method, url_ext, time.monotonic() - start, response.status_code)
+                if attempt + 1 >= self.retry.attempts or not self.retry.retriable(idempotent, response.status_code):
+                    return response
+
+            delay = self.retry.delay(attempt, response)
+            logger.info(method + " " + url_ext + " failed, retrying in " + str(round(delay, 1)) + " seconds")
+            time.sleep(delay)
+            attempt += 1
+
+    def get(self, url_ext, **kwargs) -> Any:
+        return self.request('GET', url_ext, **kwargs)
+
+    def post(self, url_ext, **kwargs) -> Any:
+        return self.request('POST', url_ext, **kwargs)
+
+    def put(self, url_ext, **kwargs) -> Any:
+        return self.request('PUT', url_ext, **kwargs)
+
+
+def iter_pages(client, url_ext, func_name, params=None, page_size=1000, **kwargs) -> Any:
+    """Yield the items of every page of a list endpoint, one page in memory at a time"""
+    params = dict(params or {})
+    params['page_size'] = page_size
+    page_number = 1
+    fetched = 0
+
+    while True:
+        params['page_number'] = page_number
+        exec_job = client.get(url_ext, params=params, **kwargs)
+        api_call_status(func_name, exec_job)
+        extract_info = json.loads(exec_job.text)
+        yield from extract_info['responseList']
+        fetched += len(extract_info['responseList'])
+
+        total = extract_info.get('_pageInfo', {}).get('total')
+        if total is not None:
+            if fetched >= total or not extract_info['responseList']:
+                break
+        elif len(extract_info['responseList']) < page_size:
+            break
+        page_number += 1
+
+
+def get_all_pages(client, url_ext, func_name, params=None, page_size=1000) -> Any:
+    """Walk every page of a list endpoint and return the combined responseList"""
+    return list(iter_pages(client, url_ext, func_name, params, page_size))
+
+
+class AsyncResponse(NamedTuple):
+    """Status, body and headers of an AsyncEngineClient call, usable with api_call_status"""
+    status_code: int
+    text: str
+    headers: Any
+
+
+class AsyncEngineClient:
+    """asyncio counterpart of EngineClient built on aiohttp.
+
+    One keep-alive connector limited to limit_per_host connections carries all
+    calls, so thousands of metadata or polling requests can be multiplexed on
+    one event loop. Use as 'async with AsyncEngineClient(...) as client'.
+    An existing token can be passed in req_headers to skip the login.
+    asyncio and aiohttp are imported on first use, not with this module.
+    """
+
+    def __init__(self, host, user=None, password=None, api_path='/masking/api', token_ttl=1800, limit_per_host=10,
+                 retry=None, api_key=None, req_headers=None):
+        import asyncio
+        try:
+            import aiohttp
+        except ImportError:
+            raise ImportError("AsyncEngineClient needs the aiohttp package")
+        self.host = host
+        self.user = user
+        self.password = password
+        self.api_key = api_key
+        self.api_path = api_path
+        self.token_ttl = token_ttl
+        self.limit_per_host = limit_per_host
+        self.retry = retry if retry is not None else default_retry
+        self.baseurl = None
+        self.req_headers = req_headers
+        self.login_time = time.monotonic() if req_headers is not None else 0.0
+        self.lock = asyncio.Lock()
+        self.session = None
+
+    async def __aenter__(self):
+        import asyncio
+        import aiohttp
+
+        connector = aiohttp.TCPConnector(limit_per_host=self.limit_per_host, ssl=False)
+        self.session = aiohttp.ClientSession(connector=connector)
+        loop = asyncio.get_running_loop()
+        scheme = await loop.run_in_executor(None, probe_scheme, self.host)
+        self.baseurl = scheme + '://' + self.host + self.api_path
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    async def login(self) -> Any:
+        logger = logging.getLogger(__name__)
+
+        logger.info("Delphix API authentication ")
+
+        if self.api_key is not None:
+            self.req_headers = {'Accept': 'application/json', 'Authorization': 'apk ' + str(self.api_key)}
+            self.login_time = float('inf')
+            return
+
+        formdata = '{ "type": "LoginRequest", "username": "' + self.user + '", "password": "' + self.password + '" }'
+        request = await self.timed_request('POST', '/login', {'Content-Type': 'application/json'}, idempotent=True,
+                                           data=formdata, allow_redirects=False)
+        api_call_status('authenticating', request)
+        j = json.loads(request.text)
+
+        self.req_headers = {'Accept': 'application/json', 'Authorization': j['Authorization']}
+        self.login_time = time.monotonic()
+
+    async def ensure_login(self) -> Any:
+        async with self.lock:
+            if self.req_headers is None or time.monotonic() - self.login_time > self.token_ttl:
+                await self.login()
+
+    async def request(self, method, url_ext, **kwargs) -> AsyncResponse:
+        """Send a request relative to the engine API, re-authenticating once on a 401"""
+        await self.ensure_login()
+        headers = self.req_headers
+        response = await self.timed_request(method, url_ext, headers, **kwargs)
+        if response.status_code == 401:
+            async with self.lock:
+                if self.req_headers is headers:
+                    await self.login()
+            response = await self.timed_request(method, url_ext, self.req_headers, **kwargs)
+        return response
+
+    async def timed_request(self, method, url_ext, headers, idempotent=None, **kwargs) -> AsyncResponse:
+        """Send one request with retries on transient failures, recording the latency of each attempt"""
+        import asyncio
+        import aiohttp
+
+        logger = logging.getLogger(__name__)
+
+        if idempotent is None:
+            idempotent = method != 'POST'
+
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            try:
+                async with self.session.request(method, self.baseurl + url_ext, headers=headers, **kwargs) as r:
+                    response = AsyncResponse(r.status, await r.text(), r.headers)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                metrics.observe_api(method, url_ext, time.monotonic() - start, 0)
+                if attempt + 1 >= self.retry.attempts or not idempotent:
+                    raise TransientApiError(method + ' ' + url_ext, 0, str(e))
+                response = None
+            else:
+                metrics.observe_api(method, url_ext, time.monotonic() - start, response.status_code)
+                if attempt + 1 >= self.retry.attempts or not self.retry.retriable(idempotent, response.status_code):
+                    return response
+
+            delay = self.retry.delay(attempt, response)
+            logger.info(method + " " + url_ext + " failed, retrying in " + str(round(delay, 1)) + " seconds")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def get(self, url_ext, **kwargs) -> AsyncResponse:
+        return await self.request('GET', url_ext, **kwargs)
+
+    async def post(self, url_ext, **kwargs) -> AsyncResponse:
+        return await self.request('POST', url_ext, **kwargs)
+
+    async def put(self, url_ext, **kwargs) -> AsyncResponse:
+        return await self.request('PUT', url_ext, **kwargs)
+
+    async def iter_pages(self, url_ext, func_name, params=None, page_size=1000) -> Any:
+        """Async generator over the items of every page of a list endpoint"""
+        params = dict(params or {})
+        params['page_size'] = page_size
+        page_number = 1
+        fetched = 0
+
+        while True:
+            params['page_number'] = page_number
+            exec_job = await self.get(url_ext, params=params)
+            api_call_status(func_name, exec_job)
+            extract_info = json.loads(exec_job.text)
+            for item in extract_info['responseList']:
+                yield item
+            fetched += len(extract_info['responseList'])
+
+            total = extract_info.get('_pageInfo', {}).get('total')
+            if total is not None:
+                if fetched >= total or not extract_info['responseList']:
+                    break
+            elif len(extract_info['responseList']) < page_size:
+                break
+            page_number += 1
+
+    async def get_all_pages(self, url_ext, func_name, params=None, page_size=1000) -> Any:
+        return [item async for item in self.iter_pages(url_ext, func_name, params, page_size)]
+
+
+async def gather_limited(limit, coroutines) -> Any:
+    """Await coroutines with at most limit of them running at a time, results in input order"""
+    import asyncio
+
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(run(c) for c in coroutines))
@@ -30,135 +30,94 @@
 #       ./execute_dlpx -dh <<delphix host>> -du <<delphix user>> -dp <<delphix password>> -job
 #                                   <<job id>> -jt <<job type - profile or mask>>
 
-import argparse
-import inspect
 import Onboard_Exec
 import json
-import socket
 import os
 import os.path
 import datetime
 from datetime import datetime
 import sys
 from sys import exit
-import subprocess
-from subprocess import Popen, PIPE
 import time
-import requests
-from requests.exceptions import RequestException
+import csv
+import contextlib
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from config_store import JsonConfigStore, open_config_store
+from dlpx_client import EngineApiError, EngineClient, PollingStrategy, api_call_status
+from secrets_provider import open_secrets_provider
+from cryptography.fernet import Fernet
 #from functools import cached_property
 
 from typing import List, Optional, Tuple, Any
 
 import logging
 
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
 
-def api_call_status(func_name, request):
-    status_code = request.status_code
-    status_msg = request.text
-    if status_code != 200:
-        logging.info(f"Request in operation {func_name} failed with status code {status_code}")
-        logging.info(f"Message: {status_msg}")
-        print(f"Request in operation {func_name} failed with status code {status_code}")
-        print(f"Message: {status_msg}")
-        os._exit(1)
-    else:
-        logging.info(f"Request in Function {func_name} succeeds with status code {status_code}")
+try:
+    import pymongo
+except ImportError:
+    pymongo = None
 
 
 def authenticate_api() -> Any:
     """Trigger profiling or masking """
     global dlpx_host, dlpx_user, dlpx_pass, baseurl, job_id
 
-    baseurl_80 = 'http://' + dlpx_host + '/hyperscale-compliance'
-    baseurl_443 = 'https://' + dlpx_host + '/hyperscale-compliance'
-
-    logger = logging.getLogger(__name__)
-
-    logger.info("Delphix API authentication ")
-
-    a_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    r_check = a_socket.connect_ex((dlpx_host, 80))
-
-    if r_check == 0:
-        baseurl = baseurl_80
-    else:
-        baseurl = baseurl_443
-    a_socket.close()
-
-    req_headers = {'Content-Type': 'application/json'}
-
-    session = requests.session()
-    formdata = '{ "type": "LoginRequest", "username": "' + dlpx_user + '", "password": "' + dlpx_pass + '" }'
-    request = session.post(baseurl + '/login', data=formdata, headers=req_headers, allow_redirects=False, verify=False)
-    api_call_status('authenticating', request)
-    j = json.loads(request.text)
-    authapi = j['Authorization']
-
-    req_headers = {'Accept': 'application/json', 'Authorization': authapi}
-    return session, req_headers
+    client = EngineClient(dlpx_host, dlpx_user, dlpx_pass, api_path='/hyperscale-compliance')
+    client.ensure_login()
+    baseurl = client.baseurl
+    return client.session, client.req_headers
 
 def get_engines() -> Any:
-    """Trigger profiling or masking """
+    """Return the list of engines known to the Hyperscale host"""
     global dlpx_host, apk
 
-    baseurl_80 = 'http://' + dlpx_host + '/api'
-    baseurl_443 = 'https://' + dlpx_host + '/api'
-
     logger = logging.getLogger(__name__)
 
-    logger.info("Delphix API authentication ")
+    client = EngineClient(dlpx_host, api_path='/api', api_key=apk)
+    request = client.get('/engines')
+    api_call_status('get engines', request)
+    j = json.loads(request.text)
+    logger.info("Engines: " + str(j))
 
-    a_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    r_check = a_socket.connect_ex((dlpx_host, 80))
+    if isinstance(j, dict):
+        return j.get('items', j.get('response_list', []))
+    return j
 
-    if r_check == 0:
-        baseurl = baseurl_80
-    else:
-        baseurl = baseurl_443
-    a_socket.close()
+FernetKey = b'4k89b1lPNQKq2sT5gYq8cptMDHRjKaRTIRkhTZa9F2I='
 
-    req_headers = {'Accept': 'application/json', 'Authorization': 'apk ' + str(apk)}
-    #req_headers = {'Content-Type': 'application/json'}
 
-    session = requests.session()
-    request = session.get(baseurl + '/engines', headers=req_headers, verify=False)
-    #api_call_status('authenticating', request)
-    j = json.loads(request.text)
-    print("return: " +str(j))
-
-    return
+@functools.lru_cache(maxsize=None)
+def fernet(key) -> Fernet:
+    """One Fernet instance per key, built on first use"""
+    return Fernet(key)
 
 def decrypt(strPass):
-    key = b'4k89b1lPNQKq2sT5gYq8cptMDHRjKaRTIRkhTZa9F2I='
-    f = Fernet(key)
-    decryptPass = f.decrypt(strPass).decode()
+    decryptPass = fernet(FernetKey).decrypt(strPass).decode()
     return decryptPass
 
 def encrypt(strPass):
-    key = b'4k89b1lPNQKq2sT5gYq8cptMDHRjKaRTIRkhTZa9F2I='
     encodestr = strPass.encode()
-    fkey = Fernet(key)
-    encryptPass = fkey.encrypt(encodestr)
+    encryptPass = fernet(FernetKey).encrypt(encodestr)
     return encryptPass
 
 def encrypt_Password():
-    global ConfigPath
-
-    fappConfig = open(ConfigPath)
-    app_data = json.load(fappConfig)
-    fappConfig.close()
+    store = get_config_store()
 
-    if app_data['hyperscale_config']['encrypted'].upper() == 'Y':
-        print("Hyperscale APK is already encrypted. No action taken!")
-    else:
-        app_data['hyperscale_config']['encrypted'] = 'Y'
-        en_pass = encrypt(app_data['hyperscale_config']['apk'])
-        app_data['hyperscale_config']['apk'] = en_pass.decode("utf-8")
-
-        with open(ConfigPath, "w") as outfile:
-            json.dump(app_data, outfile, indent=4)
-        outfile.clos()
+    with store_transaction(store):
+        hyperscale_config = store.section('hyperscale_config')
+        if hyperscale_config['encrypted'].upper() == 'Y':
+            print("Hyperscale APK is already encrypted. No action taken!")
+        else:
+            en_pass = encrypt(hyperscale_config['apk'])
+            store.update_section('hyperscale_config', encrypted='Y', apk=en_pass.decode("utf-8"))
 
     print("Passwords and APKs are encrypted in the config file")
 
@@ -170,59 +129,593 @@ def read_config() -> Any:
 
 
     logger = logging.getLogger(__name__)
-    logger.info("Started fetching user credentials for " + indicator + " DB")
+    logger.info("Started fetching user credentials for " + dbname + " DB")
 
-    fConfig = open(ConfigPath)
-    data = json.load(fConfig)
-    fConfig.close()
+    store = get_config_store()
+    profiler_scripts = store.section('profiler_scripts')
+    hashi_config = store.section('hashi_config')
+    hyperscale_config = store.section('hyperscale_config')
+    cc_engine = store.section('delphix_compliance')
 
-    profiler_scripts = data['profiler_scripts']
-    hashi_config = data['hashi_config']
-    hyperscale_config = data['hyperscale_config']
-    cc_engine = data['delphix_compliance']
-    try:
-        db_config = next(d for d in data['database'] if d['name'] == dbname and d['db_type'].upper() == dbtype.upper())
-        if db_config['onboard'] == 'yes':
-            print("Database already onboarded!")
-            exit(1)
-        else:
-            onboard_status = db_config['onboard']
-    except KeyError as e:
-        onboard_status = 'new'
-
-    #if dbschema == all then make an entry into config file for each schema
-    db_config['name'] = dbname
-    db_config['host'] = dbhost
-    db_config['port'] = dbport
+    db_config = prepare_db_config(store, dbname, dbhost, dbport, dbtype, dbschema, secret_path)
+    if db_config is None:
+        print("Database already onboarded!")
+        exit(1)
+
+    return
+
+
+def prepare_db_config(store, name, host, port, db_type, schema, secret_path) -> Any:
+    """Save and return the config entry of a database to onboard, None when it is already onboarded"""
+    db_config = dict(store.get_database(name, db_type) or {})
+    onboard_status = db_config.get('onboard', 'new')
+    if onboard_status == 'yes':
+        return None
+
+    db_config['name'] = name
+    db_config['host'] = host
+    db_config['port'] = port
     db_config['secret_path'] = secret_path
-    db_config['db_type'] = dbtype
-    db_config['db_schema'] = dbschema
+    db_config['db_type'] = db_type
+    db_config['db_schema'] = schema
     db_config['onboard'] = onboard_status
 
-    if onboard_status == 'new':
-        data['database'].append(db_config)
-        with open(ConfigPath, 'w') as file:
-            json.dump(data, file, indent=4)
+    if schema == 'all':
+        """Make an entry in the config for each schema, onboarded one by one by onboard_schemas"""
+        schemas = discover_schemas(db_config)
+        if schemas:
+            db_config['schemas'] = schemas
+            for schema in schemas:
+                db_config.setdefault('schema_config', {}).setdefault(schema, {'onboard': 'new'})
+
+    store.upsert_database(db_config)
+    return db_config
+
+
+def discover_schemas(db_config) -> Any:
+    """Schemas of a database: the schemas list of its config entry, else read from the database.
+
+    aurora (PostgreSQL) needs psycopg2 and atlas (MongoDB, one schema per
+    collection) needs pymongo and MONGODB_URI. The login is the username and
+    password of the secret at secret_path, else the PG* environment variables.
+    Returns None when the schemas cannot be listed: driver errors (connection,
+    login, query) are logged, and also when the secret cannot be read.
+    """
+    logger = logging.getLogger(__name__)
+
+    if db_config.get('schemas'):
+        return list(db_config['schemas'])
+
+    if db_config['db_type'].lower() == 'aurora' and psycopg2 is not None:
+        credentials = db_credentials(db_config.get('secret_path'))
+        if credentials is not None:
+            try:
+                conn = psycopg2.connect(host=db_config['host'], port=db_config['port'], dbname=db_config['name'],
+                                        user=credentials.get('username'), password=credentials.get('password'))
+                try:
+                    with conn.cursor() as cursor:
+                        cursor.execute("SELECT schema_name FROM information_schema.schemata "
+                                       "WHERE schema_name NOT LIKE 'pg\\_%' AND schema_name <> 'information_schema' "
+                                       "ORDER BY schema_name")
+                        return [row[0] for row in cursor.fetchall()]
+                finally:
+                    conn.close()
+            except psycopg2.Error as e:
+                logger.info("Listing the schemas of " + db_config['name'] + " failed: " + str(e))
+
+    if db_config['db_type'].lower() == 'atlas' and pymongo is not None:
+        credentials = db_credentials(db_config.get('secret_path'))
+        if credentials is not None:
+            try:
+                client = pymongo.MongoClient(os.environ.get('MONGODB_URI', 'mongodb://' + db_config['host'] + ':' +
+                                                            str(db_config['port'])),
+                                             username=credentials.get('username'),
+                                             password=credentials.get('password'))
+                try:
+                    return sorted(client[db_config['name']].list_collection_names())
+                finally:
+                    client.close()
+            except pymongo.errors.PyMongoError as e:
+                logger.info("Listing the schemas of " + db_config['name'] + " failed: " + str(e))
+
+    logger.info("Cannot list the schemas of " + db_config['name'] + ", onboarding it as one unit")
+    print("Cannot list the schemas of " + db_config['name'] + ", onboarding it as one unit")
+    return None
+
+
+def onboard_schemas(db_config, operation, workers) -> Any:
+    """Onboard or profile every schema of db_config as its own unit, workers schemas at a time.
+
+    Each schema runs Onboard_Exec.call_onboard in a worker process with a copy
+    of db_config for that schema, and its status is written to the schema_config
+    of the config entry as soon as it finishes. Schemas already onboarded are
+    skipped. Returns schema -> status.
+    """
+    global profiler_scripts,hashi_config,hyperscale_config
+
+    logger = logging.getLogger(__name__)
+
+    store = get_config_store()
+    statuses = {schema: config['onboard'] for schema, config in db_config['schema_config'].items()}
+
+    with onboard_pool(workers) as executor:
+        futures = {}
+        for schema, schema_config in onboard_units(db_config):
+            futures[executor.submit(onboard_unit, schema_config, profiler_scripts, hashi_config, hyperscale_config,
+                                    operation)] = schema
+
+        for future in as_completed(futures):
+            schema = futures[future]
+            try:
+                statuses[schema] = future.result()[0]
+            except Exception as e:
+                logger.info("Schema " + schema + " failed: " + str(e))
+                statuses[schema] = 'failed'
+            store.update_schema(db_config['name'], db_config['db_type'], schema, onboard=statuses[schema])
+            print("Schema " + schema + ": " + str(statuses[schema]))
+            logger.info("Schema " + schema + ": " + str(statuses[schema]))
+
+    return statuses
+
+
+def onboard_units(db_config) -> Any:
+    """(schema, config) to pass to call_onboard: one per schema not yet onboarded, or (None, db_config)"""
+    if db_config['db_schema'] != 'all' or not db_config.get('schemas'):
+        return [(None, db_config)]
+
+    units = []
+    for schema in db_config['schemas']:
+        if db_config['schema_config'][schema]['onboard'] != 'yes':
+            schema_config = dict(db_config, db_schema=schema)
+            del schema_config['schemas'], schema_config['schema_config']
+            units.append((schema, schema_config))
+    return units
+
+
+def onboard_pool(workers) -> ProcessPoolExecutor:
+    """Processes for call_onboard, spawned rather than forked since the parent runs threads"""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def onboard_unit(db_config, profiler_scripts, hashi_config, hyperscale_config, operation) -> Any:
+    """Worker process body: call_onboard for one database or schema, returns (status, start, end)"""
+    start = time.time()
+    status = Onboard_Exec.call_onboard(db_config, profiler_scripts, hashi_config, hyperscale_config, operation)
+    return status, start, time.time()
+
+
+def read_manifest(manifest_file) -> Any:
+    """Databases to onboard from a CSV (with header) or JSON list manifest, keys as the long options of main"""
+    with open(manifest_file, newline='') as fManifest:
+        if manifest_file.lower().endswith('.json'):
+            rows = json.load(fManifest)
+        else:
+            rows = list(csv.DictReader(fManifest))
+
+    return [{'dbhost': row['dbhost'], 'dbport': str(row.get('dbport') or '5432'), 'dbname': row['dbname'],
+             'dbschema': row.get('dbschema') or 'all', 'dbtype': row['dbtype'], 'secret': row.get('secret') or None}
+            for row in rows]
+
+
+def batch_onboard(manifest, operation, workers) -> Any:
+    """Onboard every database of a manifest in one process.
+
+    Config entries are prepared (schemas listed) by workers threads and each
+    database is handed to a pool of workers onboarding processes as soon as
+    its entry is ready, one unit per schema with dbschema all. Statuses are
+    written to the config store as databases finish. At the end a single
+    Hyperscale job listing, over one client, records the job ids of all
+    onboarded databases. Returns one summary row per database.
+    """
+    global profiler_scripts,hashi_config,hyperscale_config,cc_engine
+
+    logger = logging.getLogger(__name__)
+
+    store = get_config_store()
+    profiler_scripts = store.section('profiler_scripts')
+    hashi_config = store.section('hashi_config')
+    hyperscale_config = store.section('hyperscale_config')
+    cc_engine = store.section('delphix_compliance')
+
+    secret_paths = [row['secret'] for row in manifest if row['secret']]
+    if secret_paths and (psycopg2 is not None or pymongo is not None):
+        """Resolve the credentials schema discovery needs up front, in parallel. This only warms the cache of
+        this process: call_onboard runs in spawned processes and reads its secrets itself"""
+        start = time.time()
+        try:
+            get_secrets_provider().get_many(secret_paths)
+            logger.info("Resolved " + str(len(set(secret_paths))) + " secrets in " +
+                        str(round(time.time() - start, 1)) + " seconds")
+        except Exception as e:
+            logger.info("Prefetching secrets failed: " + str(e))
+
+    summary = {}
+    db_configs = {}
+    units = {}
+
+    def prepare(row):
+        start = time.time()
+        db_config = prepare_db_config(store, row['dbname'], row['dbhost'], row['dbport'], row['dbtype'],
+                                      row['dbschema'], row['secret'])
+        return db_config, time.time() - start
+
+    with ThreadPoolExecutor(max_workers=workers) as preparers, onboard_pool(workers) as onboarders:
+        prepared = {preparers.submit(prepare, row): row for row in manifest}
+        for future in as_completed(prepared):
+            row = prepared[future]
+            key = (row['dbname'], row['dbtype'])
+            summary[key] = {'name': row['dbname'], 'db_type': row['dbtype'], 'status': 'failed', 'units': 0,
+                            'config': None, 'onboard': None, 'jobs': ''}
+            try:
+                db_config, summary[key]['config'] = future.result()
+            except Exception as e:
+                logger.info("Preparing " + row['dbname'] + " failed: " + str(e))
+                continue
+            if db_config is None:
+                summary[key]['status'] = 'already onboarded'
+                continue
+
+            db_configs[key] = db_config
+            summary[key]['results'] = {}
+            for schema, unit_config in onboard_units(db_config):
+                units[onboarders.submit(onboard_unit, unit_config, profiler_scripts, hashi_config, hyperscale_config,
+                                        operation)] = (key, schema)
+                summary[key]['units'] += 1
+            if not summary[key]['units']:
+                finish_database(store, db_configs[key], summary[key])
+
+        for future in as_completed(units):
+            key, schema = units[future]
+            try:
+                status, start, end = future.result()
+            except Exception as e:
+                logger.info("Onboarding " + key[0] + " " + str(schema) + " failed: " + str(e))
+                status, start, end = 'failed', None, None
+            summary[key]['results'][schema] = (status, start, end)
+            if schema is not None:
+                store.update_schema(key[0], key[1], schema, onboard=status)
+            if len(summary[key]['results']) == summary[key]['units']:
+                finish_database(store, db_configs[key], summary[key])
+
+    record_hyperscale_jobs(store, [row for row in summary.values() if row['status'] == 'yes'])
+    return list(summary.values())
+
+
+def finish_database(store, db_config, row) -> Any:
+    """Work out the status and onboarding time of a database from its units and save the status"""
+    results = row.pop('results')
+    starts = [start for status, start, end in results.values() if start is not None]
+    ends = [end for status, start, end in results.values() if end is not None]
+    if starts:
+        row['onboard'] = max(ends) - min(starts)
+
+    if None in results:
+        row['status'] = results[None][0]
+    else:
+        statuses = {schema: config['onboard'] for schema, config in db_config['schema_config'].items()}
+        statuses.update({schema: result[0] for schema, result in results.items()})
+        row['status'] = 'yes' if all(status == 'yes' for status in statuses.values()) else 'partial'
+
+    store.update_database(db_config['name'], db_config['db_type'], onboard=row['status'])
+    print(db_config['name'] + ": " + str(row['status']))
+    logging.getLogger(__name__).info(db_config['name'] + ": " + str(row['status']))
+
+
+def hyperscale_api_key(hyperscale_config) -> Any:
+    apk = hyperscale_config['apk']
+    if hyperscale_config.get('encrypted', 'N').upper() == 'Y':
+        apk = decrypt(apk.encode())
+    return apk
+
+
+def record_hyperscale_jobs(store, rows) -> Any:
+    """Save the Hyperscale jobs named <dbname>_<schema> of the onboarded databases as their hyperscale_jobs"""
+    global hyperscale_config
+
+    if not rows or not hyperscale_config.get('host'):
+        return
+
+    start = time.time()
+    client = EngineClient(hyperscale_config['host'], api_path='/hyperscale-compliance',
+                          api_key=hyperscale_api_key(hyperscale_config))
+    jobs = {job['name']: job['id'] for job in hyperscale_pages(client, '/jobs', 'get jobs')}
+
+    for row in rows:
+        """Exact <dbname>_<schema> names, a prefix would take the jobs of sales_eu for sales"""
+        db_config = store.get_database(row['name'], row['db_type']) or {}
+        db_jobs = match_schema_jobs(row['name'], known_schemas(db_config), jobs)
+        if db_jobs:
+            store.update_database(row['name'], row['db_type'], hyperscale_jobs=db_jobs)
+        row['jobs'] = len(db_jobs)
+
+    logging.getLogger(__name__).info("Recorded Hyperscale jobs in " + str(round(time.time() - start, 1)) + " seconds")
+
+
+def print_summary(summary, elapsed) -> Any:
+    print("{:<30}{:<8}{:<20}{:>6}{:>10}{:>10}{:>6}".format('database', 'type', 'status', 'units', 'config s',
+                                                           'onboard s', 'jobs'))
+    for row in summary:
+        print("{:<30}{:<8}{:<20}{:>6}{:>10}{:>10}{:>6}".format(
+            row['name'], row['db_type'], str(row['status']), row['units'],
+            '' if row['config'] is None else round(row['config'], 1),
+            '' if row['onboard'] is None else round(row['onboard'], 1), row['jobs']))
+    done = sum(1 for row in summary if row['status'] == 'yes')
+    print(str(done) + " of " + str(len(summary)) + " databases onboarded in " + str(round(elapsed, 1)) + " seconds")
+
+
+def read_mask_config() -> Any:
+    """Load the Hyperscale settings and the onboarded config entry of the database to mask"""
+    global db_config,hyperscale_config,dbname,dbtype,dlpx_host,apk
+
+    store = get_config_store()
+    hyperscale_config = store.section('hyperscale_config')
+    db_config = store.get_database(dbname, dbtype)
+    if db_config is None or db_config['onboard'] != 'yes':
+        print("Database " + dbname + " is not onboarded!")
+        exit(1)
+
+    dlpx_host = hyperscale_config['host']
+    apk = hyperscale_api_key(hyperscale_config)
 
     return
 
+
+def hyperscale_pages(client, url_ext, func_name, page_size=100) -> Any:
+    """Yield the items of every page of a Hyperscale list endpoint"""
+    page_number = 1
+    while True:
+        request = client.get(url_ext, params={'page_number': page_number, 'page_size': page_size})
+        api_call_status(func_name, request)
+        j = json.loads(request.text)
+        items = j.get('response_list', [])
+        yield from items
+
+        total = j.get('_page_info', {}).get('total')
+        if len(items) < page_size or (total is not None and page_number * page_size >= total):
+            break
+        page_number += 1
+
+
+def known_schemas(db_config) -> Any:
+    """Schemas of a database config: those discovered with -ds all, else the single schema it was onboarded with"""
+    schemas = list(db_config.get('schema_config', {})) or list(db_config.get('schemas') or [])
+    if not schemas and db_config.get('db_schema') not in (None, '', 'all'):
+        schemas = [db_config['db_schema']]
+    return schemas
+
+
+def match_schema_jobs(name, schemas, jobs) -> Any:
+    """Map each schema to the id of the job named exactly <name>_<schema> in jobs (job name -> id)"""
+    return {schema: jobs[name + '_' + schema] for schema in schemas if name + '_' + schema in jobs}
+
+
+def schema_jobs(client, db_config, schemas) -> Any:
+    """Map each schema to its Hyperscale job id.
+
+    Uses the hyperscale_jobs entry of the database config when onboarding
+    recorded one, else the jobs named <dbname>_<schema> on the Hyperscale host
+    for the known schemas of the database and the requested ones. Names are
+    matched exactly, jobs of database sales_eu are not taken for sales.
+    With schemas 'all' every job of the database is returned.
+    """
+    jobs = db_config.get('hyperscale_jobs')
+    if jobs is None:
+        wanted = known_schemas(db_config)
+        if schemas != 'all':
+            wanted += [schema for schema in schemas.split(',') if schema not in wanted]
+        jobs = match_schema_jobs(db_config['name'], wanted,
+                                 {job['name']: job['id'] for job in hyperscale_pages(client, '/jobs', 'get jobs')})
+
+    if schemas == 'all':
+        return jobs
+
+    missing = [schema for schema in schemas.split(',') if schema not in jobs]
+    if missing:
+        print("No Hyperscale job for schema(s) " + ', '.join(missing) + " of " + db_config['name'])
+        exit(1)
+    return {schema: jobs[schema] for schema in schemas.split(',')}
+
+
+def parse_time(value) -> Any:
+    return datetime.fromisoformat(value.replace('Z', '+00:00')) if value else None
+
+
+def table_throughput(ex_info) -> Any:
+    """Per-table rows, elapsed seconds and rows per second over all tasks of a Hyperscale execution"""
+    tables = {}
+    for task in ex_info.get('tasks', []):
+        for m in task.get('metadata') or []:
+            table = tables.setdefault(m.get('source_key', m.get('table_name')), {'rows': 0, 'start': None, 'end': None})
+            table['rows'] = max(table['rows'], m.get('total_rows') or 0)
+            start, end = parse_time(m.get('start_time')), parse_time(m.get('end_time'))
+            if start is not None and (table['start'] is None or start < table['start']):
+                table['start'] = start
+            if end is not None and (table['end'] is None or end > table['end']):
+                table['end'] = end
+
+    rows = []
+    for name, table in tables.items():
+        seconds = (table['end'] - table['start']).total_seconds() if table['start'] and table['end'] else None
+        rows.append({'table': name, 'rows': table['rows'], 'seconds': seconds,
+                     'rows_per_sec': table['rows'] / seconds if seconds else None})
+    return rows
+
+
+def run_schema_job(client, schema, job_id, polling) -> Any:
+    """Launch the Hyperscale job of a schema and poll its execution on the polling schedule until it finishes"""
+    request = client.post('/executions', json={'job_id': job_id})
+    ex_id = execution_started(schema, job_id, request)
+
+    state = {}
+    ex_info = None
+    while ex_info is None or ex_info['status'] in ('RUNNING', 'QUEUED', 'INITIALIZED'):
+        time.sleep(polling.next_delay(state, ex_info))
+        request = client.get('/executions/' + str(ex_id))
+        api_call_status('poll hyperscale execution', request)
+        ex_info = json.loads(request.text)
+
+    return execution_result(schema, job_id, ex_id, ex_info)
+
+
+def run_schema_jobs_async(jobs, max_parallel, polling) -> Any:
+    """run_schema_job of every schema on one event loop with AsyncEngineClient, max_parallel at a time"""
+    global dlpx_host,apk
+
+    import asyncio
+    from dlpx_client import AsyncEngineClient, gather_limited
+
+    async def run_all():
+        async with AsyncEngineClient(dlpx_host, api_path='/hyperscale-compliance', api_key=apk,
+                                     limit_per_host=max_parallel) as client:
+
+            async def run(schema, job_id):
+                request = await client.post('/executions', json={'job_id': job_id})
+                ex_id = execution_started(schema, job_id, request)
+
+                state = {}
+                ex_info = None
+                while ex_info is None or ex_info['status'] in ('RUNNING', 'QUEUED', 'INITIALIZED'):
+                    await asyncio.sleep(polling.next_delay(state, ex_info))
+                    request = await client.get('/executions/' + str(ex_id))
+                    api_call_status('poll hyperscale execution', request)
+                    ex_info = json.loads(request.text)
+
+                return execution_result(schema, job_id, ex_id, ex_info)
+
+            return await gather_limited(max_parallel, [run(schema, job_id) for schema, job_id in jobs.items()])
+
+    return asyncio.run(run_all())
+
+
+def execution_started(schema, job_id, request) -> Any:
+    """Check the response of an execution launch, returns the execution id"""
+    api_call_status('execute hyperscale job', request)
+    ex_id = json.loads(request.text)['id']
+    print("Schema " + schema + ": job " + str(job_id) + " execution " + str(ex_id) + " initiated!")
+    logging.getLogger(__name__).info("Schema " + schema + ": job " + str(job_id) + " execution " + str(ex_id) +
+                                     " initiated!")
+    return ex_id
+
+
+def execution_result(schema, job_id, ex_id, ex_info) -> Any:
+    print("Schema " + schema + ": execution " + str(ex_id) + " " + ex_info['status'])
+    logging.getLogger(__name__).info("Schema " + schema + ": execution " + str(ex_id) + " " + ex_info['status'])
+    return {'schema': schema, 'jobId': job_id, 'executionId': ex_id, 'status': ex_info['status'],
+            'tables': table_throughput(ex_info)}
+
+
+def hyperscale_mask(schemas) -> Any:
+    """Run the Hyperscale masking jobs of the schemas concurrently.
+
+    At most hyperscale_config max_parallel executions are in flight, by default
+    as many as get_engines() reports engines; the Hyperscale host decides
+    where each one runs. Executions are polled with backoff capped at
+    poll_interval seconds, from one asyncio event loop with async_polling set.
+    Exits 1 when the database has no masking jobs.
+    """
+    global db_config,hyperscale_config,dlpx_host,apk
+
+    max_parallel = hyperscale_config.get('max_parallel') or len(get_engines()) or 1
+    poll_interval = hyperscale_config.get('poll_interval', 60)
+    polling = PollingStrategy(initial=min(1.0, poll_interval), cap=poll_interval)
+    client = EngineClient(dlpx_host, api_path='/hyperscale-compliance', api_key=apk, pool_size=max_parallel)
+    jobs = schema_jobs(client, db_config, schemas)
+    if not jobs:
+        print("No Hyperscale jobs found for " + db_config['name'] + ", nothing to mask")
+        logging.getLogger(__name__).info("No Hyperscale jobs found for " + db_config['name'])
+        exit(1)
+
+    if async_polling:
+        results = run_schema_jobs_async(jobs, max_parallel, polling)
+    else:
+        with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+            futures = [executor.submit(run_schema_job, client, schema, job_id, polling)
+                       for schema, job_id in jobs.items()]
+            results = [future.result() for future in futures]
+
+    print("{:<20}{:<40}{:>14}{:>12}{:>14}".format('schema', 'table', 'rows', 'seconds', 'rows/sec'))
+    for result in results:
+        for t in result['tables']:
+            print("{:<20}{:<40}{:>14}{:>12}{:>14}".format(
+                result['schema'], str(t['table']), t['rows'],
+                '' if t['seconds'] is None else round(t['seconds'], 1),
+                '' if t['rows_per_sec'] is None else round(t['rows_per_sec'])))
+
+    return results
+
+def get_config_store() -> Any:
+    """Open the config store of ConfigPath once per process"""
+    global ConfigPath, config_store
+
+    if config_store is None or config_store.path != ConfigPath:
+        config_store = open_config_store(ConfigPath)
+    return config_store
+
+
+def store_transaction(store) -> Any:
+    """Group several updates of a JSON store into one locked rewrite, SQLite updates are atomic on their own"""
+    if isinstance(store, JsonConfigStore):
+        return store.transaction()
+    return contextlib.nullcontext()
+
+
+def get_secrets_provider() -> Any:
+    """Open the cached secrets provider of hashi_config once per process"""
+    global hashi_config, secrets_provider
+
+    with secrets_lock:
+        if secrets_provider is None:
+            secrets_provider = open_secrets_provider(hashi_config)
+    return secrets_provider
+
+
+def db_credentials(secret_path) -> Any:
+    """Secret at a database secret path, {} when the database has none and None when it cannot be read"""
+    if not secret_path:
+        return {}
+    try:
+        return get_secrets_provider().get(secret_path)
+    except Exception as e:
+        logging.getLogger(__name__).info("Cannot read the secret " + secret_path + ": " + repr(e))
+        return None
+
+
 ConfigPath = './conf/hyper_config.json'
+config_store = None
+async_polling = False
+secrets_provider = None
+secrets_lock = threading.Lock()
 def main():
-    global args,db_config,profiler_scripts,hyperscale_config,ConfigPath,dbschema,dbname,dbtype,dbhost,dbport,secret_path
+    import argparse
+
+    global args,db_config,profiler_scripts,hyperscale_config,ConfigPath,dbschema,dbname,dbtype,dbhost,dbport,secret_path,\
+        async_polling
 
     parser = argparse.ArgumentParser()
 
     # Add long and short argument
-    parser.add_argument("--dbhost", "-dh", required=True, help="Database Host")
+    parser.add_argument("--dbhost", "-dh", help="Database Host")
     parser.add_argument("--dbport", "-dp", default = "5432", help="Database Port")
-    parser.add_argument("--dbname", "-db", required=True, help="Database Name")
+    parser.add_argument("--dbname", "-db", help="Database Name")
     parser.add_argument("--dbschema", "-ds", default="all", help="all or specific schema name")
-    parser.add_argument("--dbtype", "-dt", required=True, choices=['aurora','atlas'], help="Database Type:  atlas or aurora ")
+    parser.add_argument("--dbtype", "-dt", choices=['aurora','atlas'], help="Database Type:  atlas or aurora ")
     parser.add_argument("--operation", "-op", required=True, choices=['1','2','3'],help="1. Onboard  2. Profile Only 3. Mask Only")
     parser.add_argument("--secret", "-sp", help="Secret Path")
+    parser.add_argument("--config", "-cf", default=ConfigPath,
+                        help="Config file: hyper_config.json, or a .db file for the SQLite store")
+    parser.add_argument("--workers", "-w", type=int, default=4,
+                        help="Schemas (-ds all) or manifest databases onboarded concurrently")
+    parser.add_argument("--manifest", "-mf",
+                        help="CSV or JSON manifest of databases to onboard (operations 1 and 2) instead of -dh/-db/-dt")
+    parser.add_argument("--async-polling", action="store_true",
+                        help="Operation 3: poll the Hyperscale executions on one asyncio event loop (needs aiohttp)")
 
     # Read arguments from the command line
     args = parser.parse_args()
+    if args.manifest is None and not (args.dbhost and args.dbname and args.dbtype):
+        parser.error("--dbhost, --dbname and --dbtype are required without --manifest")
+    if args.manifest is not None and args.operation == '3':
+        parser.error("--manifest is only supported for operations 1 and 2")
     operation = args.operation
     dbhost = args.dbhost
     dbtype = args.dbtype
@@ -230,26 +723,41 @@ def main():
     dbname = args.dbname
     dbschema = args.dbschema
     secret_path = args.secret
+    ConfigPath = args.config
+    async_polling = args.async_polling
+
+    if args.manifest is not None:
+        start = time.time()
+        summary = batch_onboard(read_manifest(args.manifest), operation, args.workers)
+        print_summary(summary, time.time() - start)
+        if any(row['status'] not in ('yes', 'already onboarded') for row in summary):
+            exit(1)
 
-    if operation in ["1","2"]:
+    elif operation in ["1","2"]:
         read_config()
-        onboard_status = Onboard_Exec.call_onboard(db_config,profiler_scripts,hashi_config,hyperscale_config,operation)
-
-        with open(ConfigPath, 'r') as file:
-            app_data = json.load(file)
-
-        for d in app_data['database']:
-            if d['name'] == dbname and d['db_type'] == dbtype:
-                d['onboard'] = onboard_status
-                break;
-
-        with open(ConfigPath, 'w') as file:
-            json.dump(app_data, file, indent=4)
+        if dbschema == 'all' and db_config.get('schemas'):
+            statuses = onboard_schemas(db_config, operation, args.workers)
+            onboard_status = 'yes' if all(status == 'yes' for status in statuses.values()) else 'partial'
+        else:
+            onboard_status = Onboard_Exec.call_onboard(db_config,profiler_scripts,hashi_config,hyperscale_config,operation)
+        get_config_store().update_database(dbname, dbtype, onboard=onboard_status)
+        if onboard_status != 'yes':
+            """A partial onboarding fails the run like it does in batch mode, rerun to onboard the rest"""
+            print("Onboarding of " + dbname + " ended with status " + str(onboard_status))
+            exit(1)
 
     elif operation == "3":
-        print("option 3")
+        read_mask_config()
+        results = hyperscale_mask(dbschema)
+        if any(r['status'] != 'SUCCEEDED' for r in results):
+            exit(1)
 
     #get_engines()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    try:
+        main()
+    except EngineApiError as e:
+        logging.getLogger(__name__).info(str(e))
+        print(str(e))
+        exit(1)
\ No newline at end of file
@@ -28,104 +28,101 @@
 #       2. This script can be executed standalone or as a called script from chargeback workflow
 # Usage:
 #       ./execute_dlpx -dh <<delphix host>> -du <<delphix user>> -dp <<delphix password>> -job
-#                                   <<job id>> -jt <<job type - profile or mask>>
+#                                   <<job id>> -jt <<job type - profiling or masking>> [--resume]
+#       ./execute_dlpx -dh <<delphix host>> -du <<delphix user>> -dp <<delphix password>> -job
+#                                   <<masking job ids>> -jt pipeline [-mf <<jobs in flight>>] [--resume]
 
-import argparse
-import inspect
+import hashlib
 import json
-import socket
 import os
 import os.path
-import datetime
-from datetime import datetime
-import sys
+from datetime import date
 from sys import exit
-import subprocess
-from subprocess import Popen, PIPE
 import time
-import requests
-from requests.exceptions import RequestException
-# from functools import cached_property
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import Collect_Metadata
+from dlpx_client import EngineApiError, EngineClient, AsyncEngineClient, api_call_status, get_all_pages, \
+    gather_limited, metrics, default_polling
 
-from typing import List, Optional, Tuple, Any
+from typing import NamedTuple, Any
 
 import logging
 
 
-def api_call_status(func_name, request):
-    status_code = request.status_code
-    status_msg = request.text
-    if status_code != 200:
-        logging.info(f"Request in operation {func_name} failed with status code {status_code}")
-        logging.info(f"Message: {status_msg}")
-        print(f"Request in operation {func_name} failed with status code {status_code}")
-        print(f"Message: {status_msg}")
-        os._exit(1)
-    else:
-        logging.info(f"Request in Function {func_name} succeeds with status code {status_code}")
+engine_clients = {}
+engine_clients_lock = threading.Lock()
+metadata_workers = 8
+bulk_inventory = False
+async_inventory = False
+inventoryCachePath = './inventory_cache/'
+journalPath = './refresh_journal.jsonl'
+reportPath = './'
+inventory_freshness_check = True
+inventory_cache = False
 
 
-def authenticate_api() -> Any:
-    """Trigger profiling or masking """
-    global dlpx_host, dlpx_user, dlpx_pass, baseurl, job_id
+def engine_client(host, user, password) -> EngineClient:
+    """Return the shared client for an engine and user, logging in on first use"""
+    key = (host, user)
+    with engine_clients_lock:
+        client = engine_clients.get(key)
+        if client is None or client.password != password:
+            client = EngineClient(host, user, password)
+            engine_clients[key] = client
 
-    baseurl_80 = 'http://' + dlpx_host + '/masking/api'
-    baseurl_443 = 'https://' + dlpx_host + '/masking/api'
+    client.ensure_login()
+    return client
 
-    logger = logging.getLogger(__name__)
 
-    logger.info("Delphix API authentication ")
+def get_client() -> Any:
+    """Return the shared client for the engine set in dlpx_host, dlpx_user and dlpx_pass"""
+    global dlpx_host, dlpx_user, dlpx_pass, baseurl
 
-    a_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    r_check = a_socket.connect_ex((dlpx_host, 80))
+    client = engine_client(dlpx_host, dlpx_user, dlpx_pass)
+    baseurl = client.baseurl
+    return client
 
-    if r_check == 0:
-        baseurl = baseurl_80
-    else:
-        baseurl = baseurl_443
-    a_socket.close()
 
-    req_headers = {'Content-Type': 'application/json'}
+def resolve_client(client, host, user, password) -> EngineClient:
+    """client when given, else the shared client for host, else the one for the module engine settings"""
+    if client is not None:
+        return client
+    if host:
+        return engine_client(host, user, password)
+    return get_client()
 
-    session = requests.session()
-    formdata = '{ "type": "LoginRequest", "username": "' + dlpx_user + '", "password": "' + dlpx_pass + '" }'
-    request = session.post(baseurl + '/login', data=formdata, headers=req_headers, allow_redirects=False, verify=False)
-    api_call_status('authenticating', request)
-    j = json.loads(request.text)
-    authapi = j['Authorization']
 
-    req_headers = {'Accept': 'application/json', 'Authorization': authapi}
-    return session, req_headers
+def authenticate_api() -> Any:
+    """Return the shared session and authorization headers for the current engine"""
+    client = get_client()
+    return client.session, client.req_headers
 
 
-def execute_job(host='', user='', password='', job_id_tmp='', job_type_tmp='') -> Any:
-    """Trigger profiling or masking """
-    global baseurl, dlpx_host, dlpx_user, dlpx_pass, baseurl, job_id
+def execute_job(host='', user='', password='', job_id_tmp='', job_type_tmp='', client=None) -> Any:
+    """Trigger profiling or masking of job_id_tmp and return the execution id.
 
-    logger = logging.getLogger(__name__)
+    Runs on client when given, otherwise on the shared client of host, user and
+    password, or of the module engine settings when no host is passed.
+    """
+    return start_execution(resolve_client(client, host, user, password), job_id_tmp, job_type_tmp)
 
-    filename = os.path.splitext(os.path.basename(inspect.stack()[1].filename))[0]
 
-    if filename in ("Chargeback", "pg_refresh"):
-        dlpx_host = host
-        dlpx_user = user
-        dlpx_pass = password
-        job_id = job_id_tmp
-        jobType = job_type_tmp
-        chargeback_call = 'Y'
-
-    session, req_headers = authenticate_api()
+def start_execution(client, job, indicator) -> Any:
+    """Launch a profiling or masking job and return its execution id"""
+    logger = logging.getLogger(__name__)
 
-    if jobType == 'profiling':
+    if indicator == 'profiling':
         logger.info("Execute profiling ")
     else:
         logger.info("Execute masking ")
 
-    JOBDATA = "{\"jobId\":" + job_id + "}"
+    JOBDATA = "{\"jobId\":" + str(job) + "}"
     jsondata = json.loads(JOBDATA)
 
-    exec_job = session.post(baseurl + '/executions', headers=req_headers, json=jsondata, verify=False)
-    if jobType == 'profiling':
+    exec_job = client.post('/executions', json=jsondata)
+    if indicator == 'profiling':
         api_call_status('execute profiling', exec_job)
     else:
         api_call_status('execute masking', exec_job)
@@ -134,34 +131,25 @@ def execute_job(host='', user='', password='', job_id_tmp='', job_type_tmp='') -
     return extract_info['executionId']
 
 
-def execute_polling(host='', user='', password='', exec_id_tmp='', job_type_tmp='') -> Any:
-    """Trigger profiling or masking """
-    global baseurl, dlpx_host, dlpx_user, dlpx_pass, baseurl
-
-    logger = logging.getLogger(__name__)
-
-    filename = os.path.splitext(os.path.basename(inspect.stack()[1].filename))[0]
+def execute_polling(host='', user='', password='', exec_id_tmp='', job_type_tmp='', client=None) -> Any:
+    """Fetch the current state of execution exec_id_tmp, the engine is chosen as in execute_job"""
+    return get_execution(resolve_client(client, host, user, password), exec_id_tmp, job_type_tmp)
 
-    if filename in ("Chargeback", "pg_refresh"):
-        dlpx_host = host
-        dlpx_user = user
-        dlpx_pass = password
-        exec_id = exec_id_tmp
-        jobType = job_type_tmp
-        chargeback_call = 'Y'
 
-    session, req_headers = authenticate_api()
+def get_execution(client, exec_id, indicator) -> Any:
+    """Fetch the current state of an execution"""
+    logger = logging.getLogger(__name__)
 
-    if jobType == 'profiling':
+    if indicator == 'profiling':
         logger.info("Execute profiling ")
     else:
         logger.info("Execute masking ")
 
     url_ext = '/executions/' + str(exec_id)
 
-    exec_job = session.get(baseurl + url_ext, headers=req_headers)
+    exec_job = client.get(url_ext)
 
-    if jobType == 'profiling':
+    if indicator == 'profiling':
         api_call_status('execute profiling', exec_job)
     else:
         api_call_status('execute masking', exec_job)
@@ -170,180 +158,729 @@ def execute_polling(host='', user='', password='', exec_id_tmp='', job_type_tmp=
     return extract_info
 
 
-def collect_table_inventory(ruleset_id, session, req_headers) -> Any:
-    global baseurl, dlpx_host, dlpx_user, dlpx_pass, baseurl, job_id
-
-    logger = logging.getLogger(__name__)
-
+def collect_table_inventory(ruleset_id, client) -> Any:
     output_dict = {}
 
-    url_ext = '/table-metadata?page_size=1000&ruleset_id=' + str(ruleset_id)
-    exec_job = session.get(baseurl + url_ext, headers=req_headers)
-    extract_info = json.loads(exec_job.text)
-    api_call_status('extract table-metadata', exec_job)
-
-    for tm in extract_info['responseList']:
+    for tm in get_all_pages(client, '/table-metadata', 'extract table-metadata', {'ruleset_id': ruleset_id}):
         output_dict[tm['tableMetadataId']] = tm['tableName']
 
     return output_dict
 
 
-def collect_column_inventory(table_metadata_id, session, req_headers) -> Any:
-    global baseurl, dlpx_host, dlpx_user, dlpx_pass, baseurl, job_id
+class ColumnMetadata(NamedTuple):
+    """Profiling relevant attributes of one column of a ruleset table"""
+    data_type: str
+    column_length: int
+    is_masked: bool
+    algorithm_name: str
+    is_profiler_writable: bool
+
+
+class TableColumns(dict):
+    """Columns of one table (column name -> ColumnMetadata) with a content digest taken at collection time"""
+    __slots__ = ('digest',)
+
+    def __init__(self, columns=()):
+        super().__init__(columns)
+        self.digest = hashlib.blake2b(repr(sorted(self.items())).encode(), digest_size=16).hexdigest()
 
-    logger = logging.getLogger(__name__)
 
+def column_entry(cm) -> ColumnMetadata:
+    return ColumnMetadata(cm['dataType'], cm['columnLength'], cm['isMasked'], cm.get('algorithmName', ''),
+                          cm['isProfilerWritable'])
+
+
+def collect_column_inventory(table_metadata_id, client) -> Any:
     output_dict = {}
 
-    url_ext = '/column-metadata?page_size=1000&table_metadata_id=' + str(table_metadata_id)
-    exec_job = session.get(baseurl + url_ext, headers=req_headers)
-    extract_info = json.loads(exec_job.text)
-    api_call_status('extract table-metadata', exec_job)
+    for cm in get_all_pages(client, '/column-metadata', 'extract column-metadata',
+                            {'table_metadata_id': table_metadata_id}):
+        output_dict[cm['columnName']] = column_entry(cm)
 
-    for cm in extract_info['responseList']:
-        if 'algorithmName' in cm.keys():
-            output_dict[cm['columnName']] = str(cm['dataType']) + '|' + str(cm['columnLength']) + '|' + str(
-                cm['isMasked']) + \
-                                            '|' + str(cm['algorithmName']) + '|' + str(cm['isProfilerWritable'])
-        else:
-            output_dict[cm['columnName']] = str(cm['dataType']) + '|' + str(cm['columnLength']) + '|' + str(
-                cm['isMasked']) + \
-                                            '|' + '' + '|' + str(cm['isProfilerWritable'])
+    return TableColumns(output_dict)
 
-    return output_dict
 
+def collect_ruleset_columns(tm_dictionary, client) -> Any:
+    """Bulk mode: page through all column metadata of the engine once and keep the ruleset tables.
 
-def record_Inventory(host='', user='', password='', job_id_tmp='') -> Any:
-    """Trigger profiling or masking """
-    global baseurl, dlpx_host, dlpx_user, dlpx_pass, baseurl, job_id
-    tm_dictionary = {}
-    cm_dictionary_dict = {}
+    Costs total columns / 1000 round-trips instead of one or more per table,
+    which pays off when the ruleset covers a large part of the engine.
+    """
+    cm_dictionary_dict = {value: {} for value in tm_dictionary.values()}
+
+    for cm in get_all_pages(client, '/column-metadata', 'extract column-metadata'):
+        if cm['tableMetadataId'] in tm_dictionary:
+            cm_dictionary_dict[tm_dictionary[cm['tableMetadataId']]][cm['columnName']] = column_entry(cm)
+
+    return {table: TableColumns(columns) for table, columns in cm_dictionary_dict.items()}
+
+
+def collect_columns_async(tm_dictionary, client) -> Any:
+    """Fetch the column metadata of every table on one event loop with AsyncEngineClient.
+
+    Reuses the token of the sync client and keeps metadata_workers requests in
+    flight over one keep-alive connection pool, instead of one thread per request.
+    """
+    import asyncio
+
+    async def collect():
+        client.ensure_login()
+        async with AsyncEngineClient(client.host, client.user, client.password, api_path=client.api_path,
+                                     token_ttl=client.token_ttl, limit_per_host=metadata_workers,
+                                     retry=client.retry, req_headers=client.req_headers) as aclient:
+
+            async def table_columns(table_metadata_id):
+                return TableColumns({cm['columnName']: column_entry(cm) async for cm in
+                                     aclient.iter_pages('/column-metadata', 'extract column-metadata',
+                                                        {'table_metadata_id': table_metadata_id})})
+
+            columns = await gather_limited(metadata_workers, [table_columns(key) for key in tm_dictionary.keys()])
+            return dict(zip(tm_dictionary.values(), columns))
+
+    return asyncio.run(collect())
+
+
+def record_Inventory(host='', user='', password='', job_id_tmp='', client=None) -> Any:
+    """Collect the inventory of profile job job_id_tmp and refresh its ruleset, the engine is chosen as in execute_job"""
+    return collect_inventory(resolve_client(client, host, user, password), job_id_tmp)
 
-    logger = logging.getLogger(__name__)
 
-    filename = os.path.splitext(os.path.basename(inspect.stack()[1].filename))[0]
+def snapshot_path(host, ruleset_id) -> str:
+    return os.path.join(inventoryCachePath, str(host) + '_ruleset_' + str(ruleset_id) + '.jsonl')
 
-    if filename in ("Chargeback", "pg_refresh"):
-        dlpx_host = host
-        dlpx_user = user
-        dlpx_pass = password
-        job_id = job_id_tmp
-        chargeback_call = 'Y'
 
-    session, req_headers = authenticate_api()
+def save_inventory_snapshot(host, ruleset_id, tm_dictionary, cm_dictionary_dict) -> Any:
+    """Persist an inventory as JSON lines: a header with the tables, then one line per table's columns"""
+    os.makedirs(inventoryCachePath, exist_ok=True)
+    path = snapshot_path(host, ruleset_id)
+
+    with open(path + '.tmp', 'w') as fSnapshot:
+        fSnapshot.write(json.dumps({'rulesetId': ruleset_id, 'saved': time.time(),
+                                    'tables': list(tm_dictionary.items())}) + '\n')
+        for table, columns in cm_dictionary_dict.items():
+            fSnapshot.write(json.dumps({'table': table, 'columns': columns}) + '\n')
+    os.replace(path + '.tmp', path)
+
+
+def load_inventory_snapshot(host, ruleset_id) -> Any:
+    """Load a persisted inventory, returns (tm_dictionary, cm_dictionary_dict) or None"""
+    path = snapshot_path(host, ruleset_id)
+    if not os.path.isfile(path):
+        return None
+
+    cm_dictionary_dict = {}
+    with open(path) as fSnapshot:
+        header = json.loads(fSnapshot.readline())
+        tm_dictionary = {k: v for k, v in header['tables']}
+        for line in fSnapshot:
+            entry = json.loads(line)
+            cm_dictionary_dict[entry['table']] = TableColumns((k, ColumnMetadata(*v)) for k, v in entry['columns'].items())
+
+    return tm_dictionary, cm_dictionary_dict
+
+
+def collect_inventory(client, job, use_cache=False) -> Any:
+    """Collect table and column inventory of the ruleset behind a profile job, then refresh the ruleset.
+
+    Column metadata is fetched by metadata_workers concurrent requests, or with
+    bulk_inventory set, by paging through the engine column metadata once, or
+    with async_inventory set, by collect_columns_async.
+    With use_cache the snapshot saved by the previous run is used instead when
+    present and, if inventory_freshness_check is set, its tables still match
+    the engine. Column changes made on the engine since that run are not seen,
+    which is why run_job_dag only passes use_cache with inventory_cache set.
+    """
+    cm_dictionary_dict = {}
+
+    logger = logging.getLogger(__name__)
 
     logger.info("Collect existing inventory..")
-    url_ext = '/profile-jobs/' + str(job_id)
-    exec_job = session.get(baseurl + url_ext, headers=req_headers)
-    extract_info = json.loads(exec_job.text)
+    url_ext = '/profile-jobs/' + str(job)
+    exec_job = client.get(url_ext)
     api_call_status('get profile job details', exec_job)
-    tm_dictionary = collect_table_inventory(extract_info['rulesetId'], session, req_headers)
+    extract_info = json.loads(exec_job.text)
+    ruleset_id = extract_info['rulesetId']
 
-    for key, value in tm_dictionary.items():
-        cm_dictionary_dict[value] = collect_column_inventory(key, session, req_headers)
+    snapshot = load_inventory_snapshot(client.host, ruleset_id) if use_cache else None
+    if snapshot is not None and not inventory_freshness_check:
+        tm_dictionary, cm_dictionary_dict = snapshot
+    else:
+        tm_dictionary = collect_table_inventory(ruleset_id, client)
+
+        if snapshot is not None and snapshot[0] == tm_dictionary:
+            logger.info("Using cached inventory of ruleset " + str(ruleset_id))
+            cm_dictionary_dict = snapshot[1]
+        elif bulk_inventory:
+            cm_dictionary_dict = collect_ruleset_columns(tm_dictionary, client)
+        elif async_inventory:
+            cm_dictionary_dict = collect_columns_async(tm_dictionary, client)
+        else:
+            """Fetch the column metadata of metadata_workers tables at a time"""
+            with ThreadPoolExecutor(max_workers=metadata_workers) as executor:
+                columns = executor.map(lambda key: collect_column_inventory(key, client), tm_dictionary.keys())
+                for value, column_dict in zip(tm_dictionary.values(), columns):
+                    cm_dictionary_dict[value] = column_dict
 
     """Refresh ruleset"""
-    url_ext = '/database-rulesets/' + str(extract_info['rulesetId']) + '/refresh'
-    exec_ref = session.put(baseurl + url_ext, headers=req_headers)
+    url_ext = '/database-rulesets/' + str(ruleset_id) + '/refresh'
+    exec_ref = client.put(url_ext)
     api_call_status('referesh ruleset', exec_ref)
-    return tm_dictionary, cm_dictionary_dict, extract_info['rulesetId']
+    return tm_dictionary, cm_dictionary_dict, ruleset_id
 
-def execute_profile_mask(indicator: str) -> Any:
-    global dlpx_host, dlpx_user, dlpx_pass, reportPath, pjoblist, mjoblist
 
-    logger = logging.getLogger(__name__)
+def write_mismatch_report(job_id, mismatch_list, host=None) -> Any:
+    """Write profiling mismatch observations of a job to the report directory, one file per engine and job"""
+    global dlpx_host, reportPath
 
-    if indicator == 'profiling':
-        for job in pjoblist:
-            mismatch_list = []
-            """Record existing inventory"""
-            curr_tm, curr_cm, rset = record_Inventory(dlpx_host, dlpx_user, dlpx_pass, job)
-            """Execute profiling"""
-            ex_id = execute_job(dlpx_host, dlpx_user, dlpx_pass, job, indicator)
+    if host is None:
+        host = dlpx_host
+
+    hostName = ''.join(c if c.isalnum() or c in '.-' else '_' for c in str(host))
+    reportFilePath = reportPath + hostName + '_j' + str(job_id) + '_D' + str(date.today()) + '.txt'
+    fProfileMismatch = open(reportFilePath, "a")
+    fProfileMismatch.write(
+        '======================================================================================================\n\r')
+    fProfileMismatch.write('Delphix Engine: ' + str(host) + '\n\r')
+    fProfileMismatch.write('Job ID: ' + str(job_id) + '\n\r')
+    fProfileMismatch.write('Date of Profiling: ' + str(date.today()) + '\n\r')
+    fProfileMismatch.write(
+        '......................................................................................................\n\r')
+
+    for x in mismatch_list:
+        fProfileMismatch.write(x + '\n\r')
+    fProfileMismatch.write('\n\r')
+    fProfileMismatch.close()
+    return reportFilePath
+
+
+class CompletionNotifier:
+    """Channel through which execution completions are reported besides polling.
+
+    One notifier can be shared by several waiters: each takes only the ids of
+    its own executions and completions of other executions are kept for theirs.
+    """
+
+    def wait(self, timeout, execution_ids=None) -> set:
+        """Wait up to timeout seconds, return the ids of execution_ids (any when None) reported finished, as strings"""
+        time.sleep(max(timeout, 0))
+        return set()
+
+    def close(self) -> Any:
+        pass
 
-            print(indicator + " job " + str(job) + " execution initiated!")
-            logger.info(indicator + " job " + str(job) + " execution initiated!")
 
+class QueueNotifier(CompletionNotifier):
+    """In-process notifier: a wrapper thread or a test calls notify(execution_id)"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.finished = set()
+
+    def notify(self, execution_id) -> Any:
+        with self.condition:
+            self.finished.add(str(execution_id))
+            self.condition.notify_all()
+
+    def wait(self, timeout, execution_ids=None) -> set:
+        wanted = None if execution_ids is None else {str(execution_id) for execution_id in execution_ids}
+        deadline = time.monotonic() + max(timeout, 0)
+        with self.condition:
             while True:
-                time.sleep(9)
-                """Keep polling execution results every 9 seconds"""
-                ex_info = execute_polling(dlpx_host, dlpx_user, dlpx_pass, ex_id, indicator)
+                taken = set(self.finished) if wanted is None else self.finished & wanted
+                remaining = deadline - time.monotonic()
+                if taken or remaining <= 0:
+                    self.finished -= taken
+                    return taken
+                self.condition.wait(remaining)
+
+
+class FileDropNotifier(CompletionNotifier):
+    """Picks up files named after the execution id (e.g. 1234 or 1234.done) dropped into a directory"""
+
+    def __init__(self, directory, interval=0.5):
+        self.directory = directory
+        self.interval = interval
+        os.makedirs(directory, exist_ok=True)
+
+    def wait(self, timeout, execution_ids=None) -> set:
+        wanted = None if execution_ids is None else {str(execution_id) for execution_id in execution_ids}
+        deadline = time.monotonic() + max(timeout, 0)
+        while True:
+            taken = set()
+            for name in os.listdir(self.directory):
+                execution_id = name.split('.')[0]
+                if wanted is not None and execution_id not in wanted:
+                    """Left for the waiter of that execution"""
+                    continue
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    """Taken by another waiter"""
+                    continue
+                taken.add(execution_id)
+            remaining = deadline - time.monotonic()
+            if taken or remaining <= 0:
+                return taken
+            time.sleep(min(self.interval, remaining))
+
+
+class WebhookNotifier(QueueNotifier):
+    """Local HTTP receiver, a wrapper POSTs {"executionId": 1234} to http://<host>:<port>/"""
+
+    def __init__(self, port=8765, host='127.0.0.1'):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        super().__init__()
+        notifier = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                try:
+                    notifier.notify(json.loads(body)['executionId'])
+                    self.send_response(200)
+                except (ValueError, KeyError, TypeError):
+                    self.send_response(400)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                logging.getLogger(__name__).info("Webhook " + format % args)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self) -> Any:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def open_notifier(kind, directory=None, port=8765) -> Any:
+    """Completion notifier chosen on the command line: none, drop (FileDropNotifier) or webhook (WebhookNotifier)"""
+    if kind == 'drop':
+        return FileDropNotifier(directory)
+    if kind == 'webhook':
+        return WebhookNotifier(port)
+    return None
+
+
+class RunJournal:
+    """Append-only JSON lines checkpoint of job executions, used to resume a failed refresh.
+
+    Every launch and terminal status is appended as one line. Entries are
+    grouped in runs: start() opens a new run (of one job type when indicator
+    is given, so the profiling and masking phases keep their own runs) and
+    resume() continues the last one.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def start(self, indicator=None) -> Any:
+        self.entries = {}
+        self.terminate()
+        self.append({'run': time.time(), 'indicator': indicator})
+
+    def resume(self) -> Any:
+        self.entries = {}
+        self.terminate()
+        if os.path.isfile(self.path):
+            with open(self.path) as fJournal:
+                for line in fJournal:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        """A line cut short by a crash during the write"""
+                        continue
+                    if 'run' in entry:
+                        self.entries = {k: v for k, v in self.entries.items()
+                                        if entry['indicator'] is not None and k[1] != entry['indicator']}
+                    else:
+                        self.entries[(entry['engine'], entry['indicator'], str(entry['job']))] = entry
+
+    def terminate(self) -> Any:
+        """End a last line left without its newline by a crash, so the next entry starts on a line of its own"""
+        if os.path.isfile(self.path) and os.path.getsize(self.path) > 0:
+            with open(self.path, 'rb+') as fJournal:
+                fJournal.seek(-1, os.SEEK_END)
+                if fJournal.read(1) != b'\n':
+                    fJournal.write(b'\n')
+
+    def append(self, entry) -> Any:
+        with self.lock:
+            with open(self.path, 'a') as fJournal:
+                fJournal.write(json.dumps(entry) + '\n')
+                fJournal.flush()
+                os.fsync(fJournal.fileno())
+
+    def record(self, host, task, result) -> Any:
+        indicator, job = task
+        entry = {'engine': host, 'indicator': indicator, 'job': job, 'executionId': result['executionId'],
+                 'status': result['status'], 'mismatches': len(result['mismatches']), 'time': time.time()}
+        self.entries[(host, indicator, str(job))] = entry
+        self.append(entry)
+
+    def last(self, host, task) -> Any:
+        indicator, job = task
+        return self.entries.get((host, indicator, str(job)))
+
+
+def get_ruleset_id(client, job) -> Any:
+    exec_job = client.get('/profile-jobs/' + str(job))
+    api_call_status('get profile job details', exec_job)
+    return json.loads(exec_job.text)['rulesetId']
+
+
+def build_job_dag(rows, pjoblist=None, mjoblist=None) -> Any:
+    """Build the job dependency graph from Collect_Metadata rows.
+
+    Returns {(indicator, job): set of (indicator, job) it depends on}: every
+    masking job depends on the profiling job of its own ruleset only. With
+    pjoblist / mjoblist the graph is limited to those jobs.
+    """
+    dag = {}
+    for row in rows:
+        pj = row.get('profileJobId', '')
+        mj = row.get('maskingJobId', '')
+        if pj != '' and (pjoblist is None or str(pj) in map(str, pjoblist)):
+            dag.setdefault(('profiling', pj), set())
+        else:
+            pj = ''
+        if mj != '' and (mjoblist is None or str(mj) in map(str, mjoblist)):
+            deps = dag.setdefault(('masking', mj), set())
+            if pj != '':
+                deps.add(('profiling', pj))
+    return dag
+
+
+def run_job_dag(client, dag, max_in_flight=1, fail_fast=True, polling=None, notifier=None, journal=None) -> Any:
+    """Run a graph of jobs on one engine with at most max_in_flight executions at a time.
+
+    dag maps (indicator, job) to the tasks it depends on; a task is launched
+    once all of them succeeded without profile changes, tasks with the longest
+    chain of dependents first. All running executions are polled from this
+    single loop, each on the schedule of the polling strategy (default_polling),
+    and immediately when the notifier reports their completion. Launches and
+    the inventory collections around profiling runs are done by a pool of
+    max_in_flight threads, so a long collection does not hold up the polling
+    of the other executions.
+
+    Returns a dict of task -> result with the execution id, last known status
+    and, for profiling jobs, the inventory mismatches. Tasks whose dependency
+    did not go through are SKIPPED. With fail_fast the run stops launching as
+    soon as a job fails, is cancelled or reports profile changes: the tasks
+    not launched yet are SKIPPED and the executions in flight are followed to
+    their end and reported before it returns.
+
+    With a journal every launch and outcome is checkpointed; jobs the journal
+    shows as succeeded are not run again and executions it shows as running
+    are re-attached by execution id instead of being launched again. A
+    re-attached profiling job is compared against the inventory saved before
+    its launch; without one it is reported with a mismatch, for review.
+    """
+    logger = logging.getLogger(__name__)
+
+    if polling is None:
+        polling = default_polling
+
+    def checkpoint(task):
+        if results[task]['status'] != 'RUNNING':
+            metrics.job_event(client.host, task, 'ended', results[task])
+        if journal is not None:
+            journal.record(client.host, task, results[task])
+
+    dependents = {task: [] for task in dag}
+    for task, deps in dag.items():
+        for dep in deps:
+            dependents.setdefault(dep, []).append(task)
+
+    heights = {}
+
+    def height(task):
+        if task not in heights:
+            heights[task] = 1 + max((height(t) for t in dependents.get(task, [])), default=0)
+        return heights[task]
+
+    waiting = {task: set(deps) for task, deps in dag.items()}
+    ready = [task for task, deps in waiting.items() if not deps]
+    running = {}
+    launching = {}
+    verifying = {}
+    results = {}
+    woken = threading.Event()
+
+    def finish(task, succeeded):
+        """Release the dependents of a finished task, or skip them when it did not go through"""
+        for dependent in dependents.get(task, []):
+            if dependent not in waiting:
+                continue
+            if succeeded:
+                waiting[dependent].discard(task)
+                if not waiting[dependent]:
+                    ready.append(dependent)
+            else:
+                del waiting[dependent]
+                results[dependent] = {'executionId': None, 'status': 'SKIPPED', 'mismatches': []}
+                finish(dependent, False)
+
+    def stop():
+        """fail_fast: launch nothing more, the executions in flight are still followed"""
+        for task in ready + list(waiting):
+            results[task] = {'executionId': None, 'status': 'SKIPPED', 'mismatches': []}
+        ready.clear()
+        waiting.clear()
+
+    def submit(function, *args):
+        future = pool.submit(function, *args)
+        future.add_done_callback(lambda f: woken.set())
+        return future
+
+    def launch(task):
+        """Pool thread: record the pre-run inventory of a profiling job, then start the execution"""
+        indicator, job = task
+        inventory = None
+        if indicator == 'profiling':
+            """Record existing inventory, with inventory_cache from the last run's snapshot when available,
+            and save it as the baseline of a re-attach should this run be interrupted"""
+            inventory = collect_inventory(client, job, use_cache=inventory_cache)
+            save_inventory_snapshot(client.host, inventory[2], inventory[0], inventory[1])
+        return inventory, start_execution(client, job, indicator)
+
+    def verify(task, curr_inventory):
+        """Pool thread: compare the inventory after a successful profiling run with the pre-run one"""
+        indicator, job = task
+        new_tm, new_cm, rset = collect_inventory(client, job)
+        if curr_inventory is None:
+            """Without a baseline the profile changes cannot be checked, hold the job for review"""
+            logger.info("No baseline inventory for re-attached job " + str(job) + ", needs review")
+            return ['No baseline inventory for re-attached execution ' + str(results[task]['executionId']) +
+                    ' of ruleset ' + str(rset) + ', profile changes not checked. Review the ruleset before masking']
+
+        curr_tm, curr_cm, curr_rset = curr_inventory
+        mismatch_list = compare_inventory(curr_tm, curr_cm, new_tm, new_cm, rset)
+        if not mismatch_list:
+            """Only an accepted inventory becomes the next baseline, after mismatches the pre-run one stays"""
+            save_inventory_snapshot(client.host, rset, new_tm, new_cm)
+        return mismatch_list
+
+    def started(task, ex_id, inventory):
+        state = {}
+        running[task] = {'inventory': inventory, 'poll': state,
+                         'next_poll': time.monotonic() + polling.next_delay(state)}
+        results[task] = {'executionId': ex_id, 'status': 'RUNNING', 'mismatches': []}
+        metrics.job_event(client.host, task, 'started', results[task])
+        checkpoint(task)
+
+    for task in ready:
+        del waiting[task]
+    for task in dag:
+        metrics.job_event(client.host, task, 'queued')
+
+    pool = ThreadPoolExecutor(max_workers=max(1, max_in_flight))
+    try:
+        while ready or running or launching or verifying:
+            woken.clear()
+            ready.sort(key=height, reverse=True)
+            while ready and len(running) + len(launching) < max_in_flight:
+                task = ready.pop(0)
+                indicator, job = task
+                previous = journal.last(client.host, task) if journal is not None else None
+
+                if previous is not None and previous['status'] == 'SUCCEEDED' and not previous['mismatches']:
+                    print(indicator + " job " + str(job) + " already completed, skipping")
+                    logger.info(indicator + " job " + str(job) + " already completed, skipping")
+                    results[task] = {'executionId': previous['executionId'], 'status': 'SUCCEEDED', 'mismatches': []}
+                    finish(task, True)
+                    continue
+
+                if previous is not None and previous['status'] == 'RUNNING':
+                    ex_id = previous['executionId']
+                    inventory = None
+                    if indicator == 'profiling':
+                        """Compare against the pre-run inventory saved before the launch"""
+                        snapshot = load_inventory_snapshot(client.host, get_ruleset_id(client, job))
+                        if snapshot is not None:
+                            inventory = snapshot + (None,)
+                    print(indicator + " job " + str(job) + " execution " + str(ex_id) + " re-attached!")
+                    logger.info(indicator + " job " + str(job) + " execution " + str(ex_id) + " re-attached!")
+                    started(task, ex_id, inventory)
+                else:
+                    launching[submit(launch, task)] = task
+
+            for future in [f for f in launching if f.done()]:
+                task = launching.pop(future)
+                indicator, job = task
+                inventory, ex_id = future.result()
+                print(indicator + " job " + str(job) + " execution initiated!")
+                logger.info(indicator + " job " + str(job) + " execution initiated!")
+                started(task, ex_id, inventory)
+
+            for future in [f for f in verifying if f.done()]:
+                task, ex_info = verifying.pop(future)
+                mismatch_list = future.result()
+                if mismatch_list:
+                    results[task]['mismatches'] = mismatch_list
+                    results[task]['report'] = write_mismatch_report(ex_info['jobId'], mismatch_list, client.host)
+                    checkpoint(task)
+                    finish(task, False)
+                    if fail_fast:
+                        stop()
+                else:
+                    checkpoint(task)
+                    finish(task, True)
+
+            if ready and len(running) + len(launching) < max_in_flight:
+                continue
+            if not running:
+                """Only launches or comparisons in progress, wait for the next one to complete"""
+                if launching or verifying:
+                    woken.wait()
+                continue
+
+            wait = min(r['next_poll'] for r in running.values()) - time.monotonic()
+            if notifier is not None:
+                if launching or verifying:
+                    wait = min(wait, 0.25)
+                finished = notifier.wait(wait, [results[task]['executionId'] for task in running])
+                for task in running:
+                    if str(results[task]['executionId']) in finished:
+                        running[task]['next_poll'] = 0
+            elif wait > 0:
+                woken.wait(wait)
+
+            for task in list(running):
+                """Poll the running jobs that are due"""
+                if running[task]['next_poll'] > time.monotonic():
+                    continue
+                indicator, job = task
+                ex_info = get_execution(client, results[task]['executionId'], indicator)
+                results[task]['status'] = ex_info['status']
+                if 'rowsMasked' in ex_info:
+                    results[task]['rows'] = ex_info['rowsMasked']
+
                 if ex_info['status'] == 'SUCCEEDED':
-                    """If profiling job succeeds, record column & table metadata"""
                     print(indicator + " job " + str(job) + " execution successful!")
                     logger.info(indicator + " job " + str(job) + " execution successful!")
+                    curr_inventory = running.pop(task)['inventory']
 
-                    new_tm, new_cm, rset = record_Inventory(dlpx_host, dlpx_user, dlpx_pass, job)
-
-                    """Compare inventory and collect observations"""
-                    mismatch_list = compare_inventory(curr_tm, curr_cm, new_tm, new_cm, rset)
-                    break
+                    if indicator == 'profiling':
+                        """If profiling job succeeds, compare column & table metadata"""
+                        verifying[submit(verify, task, curr_inventory)] = (task, ex_info)
+                        continue
+                    checkpoint(task)
+                    finish(task, True)
 
                 elif ex_info['status'] == 'CANCELLED':
                     print(indicator + " job " + str(
                         job) + " execution interrupted! Please fix the issue with job and resume or restart refresh")
                     logger.info(indicator + " job " + str(
                         job) + " execution interrupted! Please fix the issue with job and resume or restart refresh")
-                    exit(1)
+                    running.pop(task)
+                    checkpoint(task)
+                    finish(task, False)
+                    if fail_fast:
+                        stop()
 
                 elif ex_info['status'] == 'FAILED':
                     print(indicator + " job " + str(
                         job) + " execution failed! Please check the job logs, fix issue and resume or restart this script")
                     logger.info(indicator + " job " + str(
                         job) + " execution failed! Please check the job logs, fix issue and resume or restart this script")
-                    exit(1)
-
-            if bool(mismatch_list) and indicator == 'profiling':
-                """Display mismatch observations and exit the refresh"""
-                reportFilePath = reportPath + 'j' + str(ex_info['jobId']) + '_D' + str(date.today()) + '.txt'
-                fProfileMismatch = open(reportFilePath, "a")
-                fProfileMismatch.write(
-                    '======================================================================================================\n\r')
-                fProfileMismatch.write('Delphix Engine: ' + str(dlpx_host) + '\n\r')
-                fProfileMismatch.write('Job ID: ' + str(ex_info['jobId']) + '\n\r')
-                fProfileMismatch.write('Date of Profiling: ' + str(date.today()) + '\n\r')
-                fProfileMismatch.write(
-                    '......................................................................................................\n\r')
-
-                for x in mismatch_list:
-                    fProfileMismatch.write(x + '\n\r')
-                fProfileMismatch.write('\n\r')
-                fProfileMismatch.close()
-                print(
-                    "Profiling changes encountered. Stopping Refresh. Check the profile changes report file: " + reportFilePath)
-                exit(2)
+                    running.pop(task)
+                    checkpoint(task)
+                    finish(task, False)
+                    if fail_fast:
+                        stop()
+
+                else:
+                    running[task]['next_poll'] = time.monotonic() + polling.next_delay(running[task]['poll'], ex_info)
+    finally:
+        pool.shutdown(wait=True)
+
+    return results
+
+
+def run_jobs(client, joblist, indicator, max_in_flight=1, fail_fast=True, polling=None, notifier=None,
+             journal=None) -> Any:
+    """Run independent jobs of one kind through run_job_dag, returns a dict of job -> result"""
+    dag = {(indicator, job): set() for job in joblist}
+    results = run_job_dag(client, dag, max_in_flight, fail_fast, polling, notifier, journal)
+    return {job: result for (task_indicator, job), result in results.items()}
+
+
+def open_journal(resume, indicator=None) -> Any:
+    """Checkpoint journal of this refresh at journalPath; resume continues the last run recorded in it"""
+    journal = RunJournal(journalPath)
+    if resume:
+        journal.resume()
+    else:
+        journal.start(indicator)
+    return journal
+
+
+def execute_profile_mask(indicator: str, max_in_flight=1, fail_fast=True, resume=False, notifier=None) -> Any:
+    """Run all profiling or masking jobs, max_in_flight of them concurrently on the engine.
+
+    Progress is checkpointed in journalPath; with resume completed jobs are
+    skipped and running executions re-attached. Completions reported through
+    the notifier are polled right away.
+    """
+    global dlpx_host, dlpx_user, dlpx_pass, reportPath, pjoblist, mjoblist
+
+    if indicator == 'profiling':
+        joblist = pjoblist
     elif indicator == 'masking':
-        for job in mjoblist:
-            """Execute masking jobs"""
-            ex_id = execute_job(dlpx_host, dlpx_user, dlpx_pass, job, indicator)
+        joblist = mjoblist
+    else:
+        return {}
 
-            print(indicator + " job " + str(job) + " execution initiated!")
-            logger.info(indicator + " job " + str(job) + " execution initiated!")
+    client = get_client()
+    results = run_jobs(client, joblist, indicator, max_in_flight, fail_fast, notifier=notifier,
+                       journal=open_journal(resume, indicator))
+
+    if any(r['status'] in ('CANCELLED', 'FAILED') for r in results.values()):
+        exit(1)
+
+    reports = [r['report'] for r in results.values() if r['mismatches']]
+    if reports:
+        """Display mismatch observations and exit the refresh"""
+        print("Profiling changes encountered. Stopping Refresh. Check the profile changes report file: " +
+              ', '.join(reports))
+        exit(2)
+
+    return results
+
+
+def execute_pipelines(rows, max_in_flight=4, fail_fast=False, resume=False, notifier=None) -> Any:
+    """Run profile-then-mask pipelines of the current engine, each masking job waiting only on its own ruleset.
+
+    rows are the Collect_Metadata rows of the engine; the graph is limited to
+    pjoblist / mjoblist when those are set.
+    """
+    dag = build_job_dag(rows, globals().get('pjoblist'), globals().get('mjoblist'))
+    client = get_client()
+    results = run_job_dag(client, dag, max_in_flight, fail_fast, notifier=notifier, journal=open_journal(resume))
+
+    reports = [r['report'] for r in results.values() if r['mismatches']]
+    if reports:
+        print("Profiling changes encountered. Check the profile changes report file: " + ', '.join(reports))
+
+    """SKIPPED jobs only follow a failed job or profile changes, which decide the exit code"""
+    if any(r['status'] in ('CANCELLED', 'FAILED') for r in results.values()):
+        exit(1)
+    if reports:
+        exit(2)
+
+    return results
 
-            while True:
-                time.sleep(9)
-                """Execute polling on masking job every 9 seconds"""
-                ex_info = execute_polling(dlpx_host, dlpx_user, dlpx_pass, ex_id, indicator)
-                if ex_info['status'] == 'SUCCEEDED':
-                    print(indicator + " job " + str(job) + " execution successful!")
-                    logger.info(indicator + " job " + str(job) + " execution successful!")
-                    break
-                elif ex_info['status'] == 'CANCELLED':
-                    print(indicator + " job " + str(
-                        job) + " execution interrupted! Please fix the issue with job and restart refresh")
-                    logger.info(
-                        indicator + ' job execution interrupted! Please fix the issue with job and restart refresh')
-                    exit(1)
-                elif ex_info['status'] == 'FAILED':
-                    print(indicator + " job " + str(
-                        job) + " execution failed! Please check the job logs, fix issue and restart this script")
-                    logger.info(
-                        indicator + ' job execution failed! Please check the job logs, fix issue and restart this script')
-                    exit(1)
 
 def compare_inventory(curr_tm, curr_cm, new_tm, new_cm, rset) -> Any:
-    """Compare table metadata"""
-    """dataType|columnLength|isMasked|algorithmName|isProfilerWritable"""
+    """Compare table metadata.
+
+    Tables whose TableColumns digest did not change are skipped without looking
+    at their columns, so only changed tables get a column level diff.
+    """
 
     logger = logging.getLogger(__name__)
 
@@ -360,32 +897,43 @@ def compare_inventory(curr_tm, curr_cm, new_tm, new_cm, rset) -> Any:
             mismatch.append(mismatch_text)
             mismatch_text = None
 
+    for k, v in curr_tm.items():
+        """Check for dropped tables"""
+        if k not in new_tm.keys():
+            mismatch.append('Table dropped from the inventory. Table: ' + str(v))
+
+    changed_tables = len(new_cm.keys() ^ curr_cm.keys())
     for key, value in new_cm.items():
         if key in curr_cm.keys():
-            for sub_key, sub_value in value.items():
-                new_cm_values = sub_value.split('|')
-
+            curr_digest = getattr(curr_cm[key], 'digest', None)
+            if curr_digest is not None and curr_digest == getattr(value, 'digest', None):
+                continue
+            if curr_cm[key] == value:
+                continue
+            changed_tables += 1
+
+            for sub_key, new_cm_values in value.items():
                 if sub_key not in curr_cm[key].keys():
                     """Check if new column added"""
                     mismatch_text = 'New column added. Table: ' + str(key) + ' / Column: ' + str(sub_key)
                 else:
-                    curr_cm_values = curr_cm[key][sub_key].split('|')
+                    curr_cm_values = curr_cm[key][sub_key]
 
                     if curr_cm_values != new_cm_values:
-                        if curr_cm_values[2] != new_cm_values[2]:
+                        if curr_cm_values.is_masked != new_cm_values.is_masked:
                             """when masking indicator changes for the column"""
                             mismatch_text = 'Column PII indicator changed from no PII to PII or vice versa. Table: ' + str(
                                 key) + ' / Column: ' \
                                             + str(sub_key)
-                        elif (curr_cm_values[3] != new_cm_values[3]) and (curr_cm_values[2] == 'true'):
+                        elif (curr_cm_values.algorithm_name != new_cm_values.algorithm_name) and curr_cm_values.is_masked:
                             """when masking indicator remains same & is true and algorithm name changes"""
                             mismatch_text = 'Algorithm assignment changed. Table: ' + str(key) + ' / Column: ' + str(
                                 sub_key)
-                        elif (curr_cm_values[0] != new_cm_values[0]) and (curr_cm_values[2] == 'true'):
+                        elif (curr_cm_values.data_type != new_cm_values.data_type) and curr_cm_values.is_masked:
                             """when masking indicator remains same & is true and data type changes"""
                             mismatch_text = 'Data type of PII column changed. Table: ' + str(key) + ' / Column: ' + str(
                                 sub_key)
-                        elif (curr_cm_values[1] != new_cm_values[1]) and (curr_cm_values[2] == 'true'):
+                        elif (curr_cm_values.column_length != new_cm_values.column_length) and curr_cm_values.is_masked:
                             """when masking indicator remains same & is true and column length changes"""
                             mismatch_text = 'Column length of PII column changed. Table: ' + str(
                                 key) + ' / Column: ' + str(sub_key)
@@ -394,7 +942,81 @@ def compare_inventory(curr_tm, curr_cm, new_tm, new_cm, rset) -> Any:
                     mismatch.append(mismatch_text)
                     mismatch_text = None
 
-    if curr_cm == new_cm:
+            for sub_key in curr_cm[key].keys() - value.keys():
+                """Check if column dropped"""
+                mismatch.append('Column dropped. Table: ' + str(key) + ' / Column: ' + str(sub_key))
+
+    if changed_tables == 0:
         logger.info('Inventory Profile Matches')
 
     return mismatch
+
+
+def main():
+    import argparse
+
+    global dlpx_host, dlpx_user, dlpx_pass, reportPath, journalPath, pjoblist, mjoblist, async_inventory, \
+        inventory_cache
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--dlpxhost", "-dh", required=True, help="Delphix masking engine host")
+    parser.add_argument("--dlpxuser", "-du", required=True, help="Delphix masking engine user")
+    parser.add_argument("--dlpxpass", "-dp", required=True, help="Delphix masking engine password")
+    parser.add_argument("--job", "-job", required=True, help="Job id, or comma separated job ids")
+    parser.add_argument("--jobtype", "-jt", required=True, choices=['profiling', 'masking', 'pipeline'],
+                        help="Job type; pipeline runs the given masking jobs, each after the profiling job of "
+                             "its own ruleset")
+    parser.add_argument("--max-in-flight", "-mf", type=int, default=1, help="Jobs running concurrently on the engine")
+    parser.add_argument("--report-path", "-rp", default=reportPath, help="Directory for profile mismatch reports")
+    parser.add_argument("--journal", "-jr", default=journalPath, help="Checkpoint journal file")
+    parser.add_argument("--resume", action='store_true',
+                        help="Skip jobs completed by the last run and re-attach to running executions")
+    parser.add_argument("--async-inventory", action='store_true',
+                        help="Collect column metadata on one asyncio event loop (needs aiohttp)")
+    parser.add_argument("--inventory-cache", action='store_true',
+                        help="Use the inventory saved by the last clean profiling run as the baseline instead of "
+                             "collecting it again; column changes made on the engine since then are not seen")
+    parser.add_argument("--notify", "-nt", default='none', choices=['none', 'drop', 'webhook'],
+                        help="Completion notifications besides polling: files dropped in --notify-dir or a local "
+                             "webhook on --notify-port")
+    parser.add_argument("--notify-dir", "-nd", default='./notify/', help="Directory watched with --notify drop")
+    parser.add_argument("--notify-port", "-np", type=int, default=8765, help="Webhook port with --notify webhook")
+    parser.add_argument("--metrics-json", "-mj", help="Write job and API timing metrics to this JSON file")
+    parser.add_argument("--metrics-prom", "-mp", help="Write the metrics to this Prometheus text file")
+
+    args = parser.parse_args()
+    dlpx_host = args.dlpxhost
+    dlpx_user = args.dlpxuser
+    dlpx_pass = args.dlpxpass
+    reportPath = args.report_path
+    journalPath = args.journal
+    async_inventory = args.async_inventory
+    inventory_cache = args.inventory_cache
+    pjoblist = mjoblist = args.job.split(',')
+    notifier = open_notifier(args.notify, args.notify_dir, args.notify_port)
+
+    try:
+        if args.jobtype == 'pipeline':
+            rows = [row for row in Collect_Metadata.iter_engine_rows(get_client())
+                    if str(row['maskingJobId']) in mjoblist]
+            pjoblist = mjoblist = None
+            execute_pipelines(rows, args.max_in_flight, resume=args.resume, notifier=notifier)
+        else:
+            execute_profile_mask(args.jobtype, args.max_in_flight, resume=args.resume, notifier=notifier)
+    except EngineApiError as e:
+        logging.getLogger(__name__).info(str(e))
+        print(str(e))
+        print("Fix the issue and rerun with --resume to continue the refresh")
+        exit(1)
+    finally:
+        if notifier is not None:
+            notifier.close()
+        if args.metrics_json:
+            metrics.write_json(args.metrics_json)
+        if args.metrics_prom:
+            metrics.write_prometheus(args.metrics_prom)
+
+
+if __name__ == '__main__':
+    main()
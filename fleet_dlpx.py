@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# ================================================================================
+# File:         fleet_dlpx.py
+# Type:         python script
+# Date:         October 18th 2026
+# Author:       Ranjeeth Kashetty
+# Ownership:    This script is owned and maintained by the user, not by Delphix
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+# Description:
+#       Script to run metadata collection or job execution against a fleet of masking engines
+#
+# Prerequisites:
+#       1. Engines file: JSON list of {"host", "user", "password"} entries, for job execution
+#          with "profile_jobs" and "masking_jobs" lists per engine
+# Usage:
+#       ./fleet_dlpx.py -ef <<engines file>> -op <<metadata or execute>> -o <<output file>>
+
+import argparse
+import json
+import queue
+import threading
+import time
+from sys import exit
+from concurrent.futures import ThreadPoolExecutor
+
+from typing import Any
+
+import logging
+
+import Collect_Metadata
+import execute_dlpx
+from dlpx_client import EngineClient
+
+
+def read_engines(engines_file) -> Any:
+    with open(engines_file) as fEngines:
+        return json.load(fEngines)
+
+
+def engine_metadata(engine, engine_workers) -> Any:
+    """Yield the metadata rows of one engine"""
+    client = EngineClient(engine['host'], engine['user'], engine['password'], pool_size=engine_workers)
+    yield from Collect_Metadata.iter_engine_rows(client)
+
+
+def engine_execute(engine, engine_workers) -> Any:
+    """Run the profiling and masking jobs of one engine as pipelines, yield one result row per job.
+
+    Each masking job waits only on the profiling job of its own ruleset, so a
+    failure or profile change on one ruleset does not hold up the others.
+    """
+    client = EngineClient(engine['host'], engine['user'], engine['password'], pool_size=engine_workers)
+
+    dag = execute_dlpx.build_job_dag(Collect_Metadata.iter_engine_rows(client), engine.get('profile_jobs', []),
+                                     engine.get('masking_jobs', []))
+    results = execute_dlpx.run_job_dag(client, dag, max_in_flight=engine_workers, fail_fast=False)
+    for (indicator, job), result in results.items():
+        yield {'indicator': indicator, 'job': job, 'executionId': result['executionId'],
+               'status': result['status'], 'mismatches': len(result['mismatches'])}
+
+
+def fan_out(engines, work, engine_workers=4, fleet_workers=8, errors=None) -> Any:
+    """Run work(engine, engine_workers) for every engine concurrently and yield its rows tagged with the engine.
+
+    Rows of all engines are merged into one stream in the order they are
+    produced. Engines that fail are logged and recorded in errors (host -> message).
+    When the consumer stops early the workers stop at their next row.
+    """
+    logger = logging.getLogger(__name__)
+
+    rows = queue.Queue(maxsize=1000)
+    done = object()
+    cancelled = threading.Event()
+    if errors is None:
+        errors = {}
+
+    def put(row):
+        """Queue a row, gives up once the consumer is gone"""
+        while not cancelled.is_set():
+            try:
+                rows.put(row, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def run(engine):
+        try:
+            if cancelled.is_set():
+                return
+            for row in work(engine, engine_workers):
+                row['engine'] = engine['host']
+                if not put(row):
+                    return
+        except Exception as e:
+            logger.info("Engine " + engine['host'] + " failed: " + str(e))
+            errors[engine['host']] = str(e)
+        finally:
+            put(done)
+
+    with ThreadPoolExecutor(max_workers=fleet_workers) as executor:
+        for engine in engines:
+            executor.submit(run, engine)
+
+        try:
+            remaining = len(engines)
+            while remaining:
+                row = rows.get()
+                if row is done:
+                    remaining -= 1
+                else:
+                    yield row
+        finally:
+            cancelled.set()
+
+
+def count_outcomes(rows, outcomes) -> Any:
+    """Pass execute rows through, counting failed jobs and jobs with profile changes in outcomes"""
+    for row in rows:
+        if row['status'] in ('CANCELLED', 'FAILED'):
+            outcomes['failed'] += 1
+        elif row['mismatches']:
+            outcomes['mismatches'] += 1
+        yield row
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--engines", "-ef", required=True, help="JSON file with the list of engines")
+    parser.add_argument("--operation", "-op", required=True, choices=['metadata', 'execute'],
+                        help="metadata: export metadata, execute: run profile and masking jobs")
+    parser.add_argument("--output", "-o", required=True, help="Output file")
+    parser.add_argument("--format", "-of", default="csv", choices=['csv', 'jsonl'], help="Output format")
+    parser.add_argument("--engine-workers", "-ew", type=int, default=4,
+                        help="Concurrent requests (metadata) or jobs (execute) per engine")
+    parser.add_argument("--fleet-workers", "-fw", type=int, default=8, help="Engines processed concurrently")
+    parser.add_argument("--report-path", "-rp", default="./", help="Directory for profile mismatch reports")
+
+    args = parser.parse_args()
+    engines = read_engines(args.engines)
+    execute_dlpx.reportPath = args.report_path
+
+    if args.operation == 'metadata':
+        work = engine_metadata
+        fieldnames = ['engine'] + Collect_Metadata.METADATA_FIELDS
+    else:
+        work = engine_execute
+        fieldnames = ['engine', 'indicator', 'job', 'executionId', 'status', 'mismatches']
+
+    errors = {}
+    outcomes = {'failed': 0, 'mismatches': 0}
+    start = time.monotonic()
+    rows = fan_out(engines, work, args.engine_workers, args.fleet_workers, errors)
+    if args.operation == 'execute':
+        rows = count_outcomes(rows, outcomes)
+    count = Collect_Metadata.write_metadata(rows, args.output, args.format, fieldnames)
+    elapsed = time.monotonic() - start
+
+    print("Wrote " + str(count) + " rows from " + str(len(engines)) + " engines to " + args.output + " in " +
+          str(round(elapsed, 1)) + " seconds")
+    for host, message in errors.items():
+        print("Engine " + host + " failed: " + message)
+    if outcomes['failed']:
+        print(str(outcomes['failed']) + " jobs failed or were cancelled")
+    if outcomes['mismatches']:
+        print("Profiling changes encountered on " + str(outcomes['mismatches']) + " jobs. Check the profile changes "
+              "report files in " + args.report_path)
+    if errors or outcomes['failed']:
+        exit(1)
+    if outcomes['mismatches']:
+        exit(2)
+
+
+if __name__ == '__main__':
+    main()
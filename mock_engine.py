@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# ================================================================================
+# File:         mock_engine.py
+# Type:         python module
+# Date:         October 18th 2026
+# Author:       Ranjeeth Kashetty
+# Ownership:    This script is owned and maintained by the user, not by Delphix
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+# Description:
+#       In-process stand-in for a masking engine, plugged in as the requests transport of
+#       EngineClient. Serves synthetic or recorded responses with configurable latency and
+#       job durations and counts the requests it receives
+#
+# Usage:
+#       engine = MockEngine.synthetic(tables=1000)
+#       with engine.installed('mock-engine'):
+#           execute_dlpx.record_Inventory('mock-engine', 'user', 'password', 1)
+#       print(engine.requests)
+
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from urllib.parse import parse_qs, urlsplit
+
+from requests import Response
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from typing import Any
+
+import dlpx_client
+
+API_PATHS = ('/masking/api', '/hyperscale-compliance', '/api')
+
+LIST_FILTERS = {'application_id': 'applicationId', 'environment_id': 'environmentId', 'ruleset_id': 'rulesetId',
+                'table_metadata_id': 'tableMetadataId'}
+
+ID_FIELDS = {'/applications': 'applicationId', '/environments': 'environmentId',
+             '/database-connectors': 'databaseConnectorId', '/database-rulesets': 'databaseRulesetId',
+             '/profile-jobs': 'profileJobId', '/masking-jobs': 'maskingJobId', '/table-metadata': 'tableMetadataId',
+             '/column-metadata': 'columnMetadataId'}
+
+
+def endpoint(method, path) -> str:
+    """'GET /executions/{id}' style key of a request, used for request counts"""
+    return method + ' ' + re.sub(r'/\d+', '/{id}', path)
+
+
+class MockEngine:
+    """Masking engine state served from memory.
+
+    Every request sleeps latency seconds (plus up to jitter), then is answered
+    from the recorded responses when one matches its method and path, else from
+    the synthetic objects. Executions run for job_duration seconds, a number or
+    a function of the job id; a finished profiling execution flips the isMasked
+    flag of a drift fraction of its ruleset columns. An error_rate fraction of
+    requests is answered with a 503.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, job_duration=1.0, drift=0.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.job_duration = job_duration
+        self.drift = drift
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.collections = {path: [] for path in ID_FIELDS}
+        self.recorded = {}
+        self.executions = {}
+        self.indexes = {}
+        self.requests = Counter()
+        self.lock = threading.Lock()
+        self.saved = None
+
+    @classmethod
+    def synthetic(cls, tables=10, columns=8, tables_per_ruleset=100, rulesets_per_environment=5,
+                  environments_per_application=5, **kwargs) -> 'MockEngine':
+        """Build an engine with tables spread over rulesets, each with a connector, a profile and a masking job"""
+        engine = cls(**kwargs)
+        add = engine.add
+
+        rulesets = max(1, -(-tables // tables_per_ruleset))
+        for r in range(rulesets):
+            if r % (rulesets_per_environment * environments_per_application) == 0:
+                app = add('/applications', {'applicationName': 'app' + str(r)})
+            if r % rulesets_per_environment == 0:
+                env = add('/environments', {'environmentName': 'env' + str(r), 'applicationId': app['applicationId']})
+
+            env_id = env['environmentId']
+            conn = add('/database-connectors', {'environmentId': env_id, 'connectorName': 'conn' + str(r),
+                                                'databaseName': 'db' + str(r), 'schemaName': 'public',
+                                                'databaseType': 'POSTGRES'})
+            rule = add('/database-rulesets', {'databaseConnectorId': conn['databaseConnectorId'],
+                                              'rulesetName': 'ruleset' + str(r), 'environmentId': env_id})
+            rule_id = rule['databaseRulesetId']
+            add('/profile-jobs', {'rulesetId': rule_id, 'environmentId': env_id, 'jobName': 'profile' + str(r)})
+            add('/masking-jobs', {'rulesetId': rule_id, 'environmentId': env_id, 'jobName': 'mask' + str(r)})
+
+            for t in range(r * tables_per_ruleset, min(tables, (r + 1) * tables_per_ruleset)):
+                table = add('/table-metadata', {'tableName': 'table' + str(t), 'rulesetId': rule_id})
+                for c in range(columns):
+                    add('/column-metadata', {'tableMetadataId': table['tableMetadataId'], 'columnName': 'col' + str(c),
+                                             'dataType': 'varchar', 'columnLength': 64, 'isMasked': c % 2 == 0,
+                                             'algorithmName': 'FullName' if c % 2 == 0 else '',
+                                             'isProfilerWritable': True})
+        return engine
+
+    def add(self, path, item) -> dict:
+        """Add an object to a collection, assigning the next id of its kind"""
+        items = self.collections[path]
+        item = dict(item)
+        item[ID_FIELDS[path]] = len(items) + 1
+        items.append(item)
+        self.indexes = {key: index for key, index in self.indexes.items() if key[0] != path}
+        return item
+
+    def index(self, path, field) -> dict:
+        """Items of a collection by the string value of field, built on first use"""
+        key = (path, field)
+        if key not in self.indexes:
+            index = {}
+            for item in self.collections[path]:
+                index.setdefault(str(item.get(field)), []).append(item)
+            self.indexes[key] = index
+        return self.indexes[key]
+
+    def load_recording(self, recording_file) -> 'MockEngine':
+        """Replay responses saved by RecordingAdapter, {"GET /path?query": {"status", "body"}} entries"""
+        with open(recording_file) as fRecording:
+            self.recorded.update(json.load(fRecording))
+        return self
+
+    def install(self, host='mock-engine') -> 'MockEngine':
+        """Route every EngineClient created from now on to this engine and skip the scheme probe of host"""
+        self.saved = (dlpx_client.transport_adapter, host, dlpx_client.scheme_cache.get(host))
+        dlpx_client.transport_adapter = MockEngineAdapter(self)
+        dlpx_client.scheme_cache[host] = ('https', float('inf'))
+        return self
+
+    def uninstall(self) -> Any:
+        adapter, host, scheme = self.saved
+        dlpx_client.transport_adapter = adapter
+        if scheme is None:
+            dlpx_client.scheme_cache.pop(host, None)
+        else:
+            dlpx_client.scheme_cache[host] = scheme
+
+    def installed(self, host='mock-engine') -> Any:
+        return _Installed(self, host)
+
+    def request_count(self) -> int:
+        with self.lock:
+            return sum(self.requests.values())
+
+    def handle(self, method, path, query, body) -> Any:
+        """Answer one request, returns (status code, JSON body)"""
+        with self.lock:
+            self.requests[endpoint(method, path)] += 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            failed = self.random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if failed:
+            return 503, {'errorMessage': 'Service unavailable'}
+
+        for key in (method + ' ' + path + ('?' + query if query else ''), method + ' ' + path):
+            if key in self.recorded:
+                return self.recorded[key]['status'], self.recorded[key]['body']
+
+        params = {k: v[0] for k, v in parse_qs(query).items()}
+        with self.lock:
+            return self.route(method, path, params, body)
+
+    def route(self, method, path, params, body) -> Any:
+        if path == '/login':
+            return 200, {'Authorization': 'mock-token-' + str(self.random.getrandbits(32))}
+
+        if path == '/executions' and method == 'POST':
+            job = body.get('jobId', body.get('job_id'))
+            ex_id = len(self.executions) + 1
+            duration = self.job_duration(job) if callable(self.job_duration) else self.job_duration
+            self.executions[ex_id] = {'executionId': ex_id, 'jobId': job, 'status': 'RUNNING', 'rowsMasked': 0,
+                                      'rowsTotal': 1000, 'started': time.monotonic(), 'duration': duration}
+            return 200, self.execution_body(ex_id)
+
+        match = re.fullmatch(r'/executions/(\d+)', path)
+        if match:
+            ex_id = int(match.group(1))
+            if ex_id not in self.executions:
+                return 404, {'errorMessage': 'Execution not found'}
+            return 200, self.execution_body(ex_id)
+
+        match = re.fullmatch(r'/database-rulesets/(\d+)/refresh', path)
+        if match and method == 'PUT':
+            return 200, {}
+
+        match = re.fullmatch(r'(/[a-z-]+)/(\d+)', path)
+        if match and match.group(1) in self.collections and method == 'GET':
+            items = self.collections[match.group(1)]
+            index = int(match.group(2)) - 1
+            if not 0 <= index < len(items):
+                return 404, {'errorMessage': 'Not found'}
+            return 200, items[index]
+
+        if path in self.collections and method == 'GET':
+            items = self.collections[path]
+            for param, field in LIST_FILTERS.items():
+                if param in params:
+                    matches = self.index(path, field).get(params[param], [])
+                    items = matches if items is self.collections[path] else [i for i in items if i in matches]
+            page_size = int(params.get('page_size', len(items) or 1))
+            page_number = int(params.get('page_number', 1))
+            page = items[(page_number - 1) * page_size:page_number * page_size]
+            return 200, {'_pageInfo': {'numberOnPage': len(page), 'total': len(items)}, 'responseList': page}
+
+        return 404, {'errorMessage': 'No mock for ' + method + ' ' + path}
+
+    def execution_body(self, ex_id) -> dict:
+        execution = self.executions[ex_id]
+        if execution['status'] == 'RUNNING':
+            elapsed = time.monotonic() - execution['started']
+            if elapsed >= execution['duration']:
+                execution['status'] = 'SUCCEEDED'
+                execution['rowsMasked'] = execution['rowsTotal']
+                self.apply_drift(execution['jobId'])
+            else:
+                execution['rowsMasked'] = int(execution['rowsTotal'] * elapsed / execution['duration'])
+        return {k: v for k, v in execution.items() if k not in ('started', 'duration')}
+
+    def apply_drift(self, job) -> Any:
+        """Flip isMasked on a drift fraction of the columns profiled by a finished profile job"""
+        jobs = self.collections['/profile-jobs']
+        if not self.drift or not isinstance(job, int) or not 0 < job <= len(jobs):
+            return
+        ruleset_id = jobs[job - 1]['rulesetId']
+        tables = {t['tableMetadataId'] for t in self.collections['/table-metadata'] if t['rulesetId'] == ruleset_id}
+        for column in self.collections['/column-metadata']:
+            if column['tableMetadataId'] in tables and self.random.random() < self.drift:
+                column['isMasked'] = not column['isMasked']
+
+
+class _Installed:
+    def __init__(self, engine, host):
+        self.engine = engine
+        self.host = host
+
+    def __enter__(self):
+        return self.engine.install(self.host)
+
+    def __exit__(self, *exc_info):
+        self.engine.uninstall()
+
+
+def api_request(request) -> Any:
+    """Split a prepared request into method, path below the API root, query string and JSON body"""
+    url = urlsplit(request.url)
+    path = url.path
+    for api_path in API_PATHS:
+        if path.startswith(api_path + '/'):
+            path = path[len(api_path):]
+            break
+
+    body = request.body
+    if isinstance(body, bytes):
+        body = body.decode()
+    return request.method, path, url.query, json.loads(body) if body else None
+
+
+class MockEngineAdapter(BaseAdapter):
+    """requests transport answering from a MockEngine instead of the network"""
+
+    def __init__(self, engine):
+        super().__init__()
+        self.engine = engine
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None) -> Response:
+        status_code, body = self.engine.handle(*api_request(request))
+
+        response = Response()
+        response.status_code = status_code
+        response.reason = 'OK' if status_code == 200 else 'Error'
+        response.headers = CaseInsensitiveDict({'Content-Type': 'application/json'})
+        response._content = json.dumps(body).encode()
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self) -> Any:
+        pass
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Pooled HTTPAdapter that keeps the responses of a live engine for MockEngine.load_recording.
+
+    Install with dlpx_client.transport_adapter = RecordingAdapter(), run the
+    scripts against the engine, then call save(recording_file).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.recorded = {}
+        self.lock = threading.Lock()
+
+    def send(self, request, **kwargs) -> Response:
+        response = super().send(request, **kwargs)
+        method, path, query, body = api_request(request)
+        if path != '/login':
+            try:
+                recorded = {'status': response.status_code, 'body': response.json()}
+            except ValueError:
+                recorded = None
+            if recorded is not None:
+                with self.lock:
+                    self.recorded[method + ' ' + path + ('?' + query if query else '')] = recorded
+        return response
+
+    def save(self, recording_file) -> Any:
+        with self.lock, open(recording_file + '.tmp', 'w') as fRecording:
+            json.dump(self.recorded, fRecording, indent=1)
+        os.replace(recording_file + '.tmp', recording_file)
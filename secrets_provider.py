@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# ================================================================================
+# File:         secrets_provider.py
+# Type:         python module
+# Date:         October 18th 2026
+# Author:       Ranjeeth Kashetty
+# Ownership:    This script is owned and maintained by the user, not by Delphix
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+# Description:
+#       Database credential lookup by secret path: HashiCorp Vault, a local JSON file standing
+#       in for it, and a TTL cache that resolves many paths concurrently
+#
+# Prerequisites:
+#       1. hvac for VaultSecretsProvider
+#       2. hashi_config section of hyper_config.json: url, token (or token_env), mount_point,
+#          namespace, verify; or secrets_file for the local stand-in; cache_ttl, workers
+
+import abc
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from typing import Any
+
+import logging
+
+try:
+    import hvac
+except ImportError:
+    hvac = None
+
+
+class SecretsProvider(abc.ABC):
+    """Returns the key / value secret stored at a path, e.g. {'username': ..., 'password': ...}"""
+
+    @abc.abstractmethod
+    def get(self, path) -> dict:
+        """Secret at path, raises when there is none"""
+
+    def get_many(self, paths) -> dict:
+        """Secrets of several paths, path -> secret"""
+        return {path: self.get(path) for path in dict.fromkeys(paths)}
+
+
+class VaultSecretsProvider(SecretsProvider):
+    """Secrets of a HashiCorp Vault KV version 2 engine"""
+
+    def __init__(self, url, token, mount_point='secret', namespace=None, verify=True):
+        if hvac is None:
+            raise ImportError("VaultSecretsProvider needs the hvac package")
+        self.client = hvac.Client(url=url, token=token, namespace=namespace, verify=verify)
+        self.mount_point = mount_point
+
+    def get(self, path) -> dict:
+        response = self.client.secrets.kv.v2.read_secret_version(path=path, mount_point=self.mount_point)
+        return response['data']['data']
+
+
+class FileSecretsProvider(SecretsProvider):
+    """Local stand-in for the vault: a JSON file of {path: {key: value}}, read again when it changes"""
+
+    def __init__(self, secrets_file):
+        self.secrets_file = secrets_file
+        self.lock = threading.Lock()
+        self.secrets = None
+        self.mtime = None
+
+    def get(self, path) -> dict:
+        with self.lock:
+            mtime = os.stat(self.secrets_file).st_mtime_ns
+            if self.secrets is None or mtime != self.mtime:
+                with open(self.secrets_file) as fSecrets:
+                    self.secrets = json.load(fSecrets)
+                self.mtime = mtime
+            if path not in self.secrets:
+                raise KeyError("No secret at " + str(path))
+            return dict(self.secrets[path])
+
+
+class CachedSecretsProvider(SecretsProvider):
+    """In-memory cache of another provider's secrets, each kept for ttl seconds.
+
+    Concurrent lookups of the same path wait for a single fetch. get_many
+    fetches the paths missing from the cache with workers concurrent lookups,
+    so credentials for a whole batch can be resolved up front.
+    """
+
+    def __init__(self, provider, ttl=300, workers=8):
+        self.provider = provider
+        self.ttl = ttl
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.cache = {}
+        self.path_locks = {}
+
+    def cached(self, path) -> Any:
+        entry = self.cache.get(path)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            return entry[0]
+        return None
+
+    def get(self, path) -> dict:
+        with self.lock:
+            secret = self.cached(path)
+            if secret is not None:
+                return secret
+            path_lock = self.path_locks.setdefault(path, threading.Lock())
+
+        with path_lock:
+            with self.lock:
+                secret = self.cached(path)
+            if secret is None:
+                secret = self.provider.get(path)
+                with self.lock:
+                    self.cache[path] = (secret, time.monotonic())
+            return secret
+
+    def get_many(self, paths) -> dict:
+        paths = list(dict.fromkeys(paths))
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return dict(zip(paths, executor.map(self.get, paths)))
+
+    def invalidate(self, path=None) -> Any:
+        with self.lock:
+            if path is None:
+                self.cache.clear()
+            else:
+                self.cache.pop(path, None)
+
+
+def open_secrets_provider(hashi_config) -> CachedSecretsProvider:
+    """Cached provider for the hashi_config section: the secrets_file stand-in when set, else Vault"""
+    logger = logging.getLogger(__name__)
+
+    if hashi_config.get('secrets_file'):
+        logger.info("Reading secrets from " + hashi_config['secrets_file'])
+        provider = FileSecretsProvider(hashi_config['secrets_file'])
+    else:
+        token = hashi_config.get('token') or os.environ.get(hashi_config.get('token_env', 'VAULT_TOKEN'))
+        provider = VaultSecretsProvider(hashi_config['url'], token, hashi_config.get('mount_point', 'secret'),
+                                        hashi_config.get('namespace'), hashi_config.get('verify', True))
+
+    return CachedSecretsProvider(provider, hashi_config.get('cache_ttl', 300), hashi_config.get('workers', 8))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# ================================================================================
+# File:         test_execute_dlpx.py
+# Type:         python tests
+# Date:         October 18th 2026
+# Author:       Ranjeeth Kashetty
+# Ownership:    This script is owned and maintained by the user, not by Delphix
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+# Description:
+#       Tests of the completion notifiers, with the file drop notifier standing in for a wrapper script
+#
+# Usage:
+#       python -m unittest test_execute_dlpx
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import execute_dlpx
+from dlpx_client import PollingStrategy
+from mock_engine import MockEngine
+
+
+def drop(directory, name, delay=0.0):
+    """Create an empty file in directory after delay seconds, in the background"""
+    def run():
+        time.sleep(delay)
+        open(os.path.join(directory, name), 'w').close()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+class FileDropNotifierTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.notifier = execute_dlpx.open_notifier('drop', self.directory)
+
+    def test_open_notifier(self):
+        self.assertIsInstance(self.notifier, execute_dlpx.FileDropNotifier)
+        self.assertIsNone(execute_dlpx.open_notifier('none'))
+
+    def test_timeout(self):
+        start = time.monotonic()
+        self.assertEqual(self.notifier.wait(0.2, [1]), set())
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+    def test_takes_dropped_ids(self):
+        drop(self.directory, '12.done', 0.1).join()
+        drop(self.directory, '13').join()
+        self.assertEqual(self.notifier.wait(1.0), {'12', '13'})
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_leaves_other_executions(self):
+        drop(self.directory, '12.done').join()
+        drop(self.directory, '14.done').join()
+        self.assertEqual(self.notifier.wait(1.0, [12]), {'12'})
+        self.assertEqual(os.listdir(self.directory), ['14.done'])
+        self.assertEqual(self.notifier.wait(1.0, ['14']), {'14'})
+
+    def test_wakes_up_on_drop(self):
+        thread = drop(self.directory, '12.done', 0.2)
+        start = time.monotonic()
+        self.assertEqual(self.notifier.wait(10.0, [12]), {'12'})
+        self.assertLess(time.monotonic() - start, 5.0)
+        thread.join()
+
+    def test_run_job_dag(self):
+        """A dropped file gets the execution polled long before its polling schedule"""
+        polling = PollingStrategy(initial=60.0, cap=60.0, jitter=0)
+        engine = MockEngine.synthetic(tables=2, job_duration=0.1)
+        with engine.installed('notify-engine'):
+            client = execute_dlpx.engine_client('notify-engine', 'user', 'password')
+            thread = drop(self.directory, '1.done', 0.3)
+            start = time.monotonic()
+            results = execute_dlpx.run_jobs(client, [1], 'masking', polling=polling, notifier=self.notifier)
+            thread.join()
+
+        self.assertLess(time.monotonic() - start, 10.0)
+        self.assertEqual(results[1]['executionId'], 1)
+        self.assertEqual(results[1]['status'], 'SUCCEEDED')
+
+
+if __name__ == '__main__':
+    unittest.main()
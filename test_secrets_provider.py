@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# ================================================================================
+# File:         test_secrets_provider.py
+# Type:         python tests
+# Date:         October 18th 2026
+# Author:       Ranjeeth Kashetty
+# Ownership:    This script is owned and maintained by the user, not by Delphix
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Copyright (c) 2020 by Delphix. All rights reserved.
+#
+# Description:
+#       Tests of the secrets providers against the file backend and a counting fake
+#
+# Usage:
+#       python -m unittest test_secrets_provider
+
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from secrets_provider import CachedSecretsProvider, FileSecretsProvider, SecretsProvider, open_secrets_provider
+
+
+class CountingProvider(SecretsProvider):
+    """Fake backend: returns {'path': path} after delay seconds and counts the lookups per path"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def get(self, path) -> dict:
+        with self.lock:
+            self.calls[path] = self.calls.get(path, 0) + 1
+        time.sleep(self.delay)
+        if path.startswith('missing'):
+            raise KeyError(path)
+        return {'path': path}
+
+    def total(self) -> int:
+        return sum(self.calls.values())
+
+
+class SecretsProviderTest(unittest.TestCase):
+
+    def test_abstract(self):
+        with self.assertRaises(TypeError):
+            SecretsProvider()
+
+    def test_file_provider(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            secrets_file = os.path.join(workdir, 'secrets.json')
+            with open(secrets_file, 'w') as fSecrets:
+                json.dump({'kv/db1': {'username': 'u1', 'password': 'p1'}}, fSecrets)
+            provider = FileSecretsProvider(secrets_file)
+            self.assertEqual(provider.get('kv/db1'), {'username': 'u1', 'password': 'p1'})
+            with self.assertRaises(KeyError):
+                provider.get('kv/db2')
+
+            with open(secrets_file, 'w') as fSecrets:
+                json.dump({'kv/db1': {'username': 'u1', 'password': 'p2'}}, fSecrets)
+            os.utime(secrets_file, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+            self.assertEqual(provider.get('kv/db1')['password'], 'p2')
+
+    def test_cache_hit(self):
+        backend = CountingProvider()
+        cache = CachedSecretsProvider(backend, ttl=60)
+        for _ in range(5):
+            self.assertEqual(cache.get('kv/db1'), {'path': 'kv/db1'})
+        self.assertEqual(backend.calls, {'kv/db1': 1})
+
+    def test_ttl_expiry(self):
+        backend = CountingProvider()
+        cache = CachedSecretsProvider(backend, ttl=0.05)
+        cache.get('kv/db1')
+        cache.get('kv/db1')
+        self.assertEqual(backend.calls['kv/db1'], 1)
+        time.sleep(0.1)
+        cache.get('kv/db1')
+        self.assertEqual(backend.calls['kv/db1'], 2)
+
+    def test_invalidate(self):
+        backend = CountingProvider()
+        cache = CachedSecretsProvider(backend, ttl=60)
+        cache.get('kv/db1')
+        cache.invalidate('kv/db1')
+        cache.get('kv/db1')
+        self.assertEqual(backend.calls['kv/db1'], 2)
+
+    def test_single_flight(self):
+        backend = CountingProvider(delay=0.1)
+        cache = CachedSecretsProvider(backend, ttl=60)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get('kv/db1'))) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(backend.calls, {'kv/db1': 1})
+        self.assertEqual(results, [{'path': 'kv/db1'}] * 10)
+
+    def test_get_many(self):
+        backend = CountingProvider(delay=0.1)
+        cache = CachedSecretsProvider(backend, ttl=60, workers=8)
+        paths = ['kv/db' + str(i % 8) for i in range(40)]
+        start = time.monotonic()
+        secrets = cache.get_many(paths)
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(sorted(secrets), sorted(set(paths)))
+        self.assertEqual(backend.total(), 8)
+        self.assertLess(elapsed, 0.5)
+
+        cache.get_many(paths)
+        cache.get('kv/db3')
+        self.assertEqual(backend.total(), 8)
+
+    def test_get_many_failure(self):
+        backend = CountingProvider()
+        cache = CachedSecretsProvider(backend, ttl=60)
+        with self.assertRaises(KeyError):
+            cache.get_many(['kv/db1', 'missing', 'kv/db2'])
+        cache.get('kv/db1')
+        cache.get('kv/db2')
+        self.assertEqual(backend.calls['kv/db1'], 1)
+        self.assertEqual(backend.calls['kv/db2'], 1)
+
+    def test_open_file_provider(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            secrets_file = os.path.join(workdir, 'secrets.json')
+            with open(secrets_file, 'w') as fSecrets:
+                json.dump({'kv/db1': {'username': 'u1'}}, fSecrets)
+            provider = open_secrets_provider({'secrets_file': secrets_file, 'cache_ttl': 10})
+            self.assertIsInstance(provider, CachedSecretsProvider)
+            self.assertEqual(provider.ttl, 10)
+            self.assertEqual(provider.get('kv/db1'), {'username': 'u1'})
+
+
+if __name__ == '__main__':
+    unittest.main()